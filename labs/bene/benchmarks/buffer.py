@@ -0,0 +1,175 @@
+from __future__ import print_function
+
+import sys
+
+sys.path.append('..')
+
+from src.buffer import ReceiveBuffer, SendBuffer
+
+import optparse
+import os
+import random
+import timeit
+
+
+class StringSendBuffer(object):
+    """ The original send buffer, which keeps the data in one string,
+        kept here as the baseline for comparison. """
+
+    def __init__(self):
+        self.buffer = b''
+        self.base_seq = 0
+        self.next_seq = 0
+        self.last_seq = 0
+
+    def available(self):
+        return self.last_seq - self.next_seq
+
+    def outstanding(self):
+        return self.next_seq - self.base_seq
+
+    def put(self, data):
+        self.buffer += data
+        self.last_seq += len(data)
+
+    def get(self, size):
+        if self.next_seq + size > self.last_seq:
+            size = self.last_seq - self.next_seq
+        start = self.next_seq - self.base_seq
+        data = self.buffer[start:start + size]
+        sequence = self.next_seq
+        self.next_seq = self.next_seq + size
+        return data, sequence
+
+    def slide(self, sequence):
+        acked = sequence - self.base_seq
+        self.buffer = self.buffer[acked:]
+        self.base_seq = sequence
+        if self.next_seq < self.base_seq:
+            self.next_seq = self.base_seq
+
+
+class Chunk(object):
+    def __init__(self, data, sequence):
+        self.data = data
+        self.length = len(data)
+        self.sequence = sequence
+
+    def trim(self, sequence, length):
+        if self.sequence < sequence + length:
+            self.data = self.data[sequence + length:]
+            self.length = len(self.data)
+            self.sequence = sequence + length
+
+
+class SortedReceiveBuffer(object):
+    """ The original receive buffer, which sorts and trims every chunk on
+        each put, kept here as the baseline for comparison. """
+
+    def __init__(self):
+        self.buffer = {}
+        self.base_seq = 0
+
+    def put(self, data, sequence):
+        if sequence < self.base_seq:
+            return
+        if sequence in self.buffer:
+            if self.buffer[sequence].length >= len(data):
+                return
+        self.buffer[sequence] = Chunk(data, sequence)
+        next_data = -1
+        length = 0
+        for sequence in sorted(self.buffer.keys()):
+            chunk = self.buffer[sequence]
+            chunk.trim(next_data, length)
+            if chunk.length == 0:
+                del self.buffer[sequence]
+            next_data = chunk.sequence
+            length = len(chunk.data)
+
+    def get(self):
+        data = b''
+        start = self.base_seq
+        for sequence in sorted(self.buffer.keys()):
+            chunk = self.buffer[sequence]
+            if chunk.sequence == self.base_seq:
+                data += chunk.data
+                self.base_seq += chunk.length
+                del self.buffer[chunk.sequence]
+        return data, start
+
+
+def transfer(buffer_class, data, window, mss=1000):
+    """ Put data into a send buffer in segments, as lab3 does with a
+        file, then send it all with a fixed window, acking each segment
+        in turn. """
+    buffer = buffer_class()
+    for i in range(0, len(data), mss):
+        buffer.put(data[i:i + mss])
+    sent = 0
+    while buffer.available() or buffer.outstanding():
+        while buffer.available() and buffer.outstanding() < window:
+            segment, sequence = buffer.get(mss)
+            sent += len(segment)
+        buffer.slide(buffer.base_seq + min(mss, buffer.outstanding()))
+    return sent
+
+
+def receive(buffer_class, data, window, loss, mss=1000):
+    """ Deliver data to a receive buffer a window at a time, in segments
+        of which a fraction given by loss is dropped the first time and
+        sent again only after the rest of the window, as happens when a
+        sender with a large window loses packets. """
+    random.seed(1)
+    buffer = buffer_class()
+    received = 0
+    for first in range(0, len(data), window):
+        lost = []
+        for sequence in range(first, min(first + window, len(data)), mss):
+            segment = data[sequence:sequence + mss]
+            if random.random() < loss:
+                lost.append((segment, sequence))
+                continue
+            buffer.put(segment, sequence)
+            received += len(buffer.get()[0])
+        for segment, sequence in lost:
+            buffer.put(segment, sequence)
+            received += len(buffer.get()[0])
+    return received
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option("-s", "--sizes", type="str", dest="sizes",
+                      default="1,2,4",
+                      help="comma-separated transfer sizes in megabytes")
+    parser.add_option("-w", "--window", type="int", dest="window",
+                      default=20000,
+                      help="window size in bytes")
+    parser.add_option("-r", "--receive-window", type="int", dest="receive_window",
+                      default=1000000,
+                      help="window size in bytes for the receive buffer")
+    parser.add_option("-l", "--loss", type="float", dest="loss",
+                      default=0.01,
+                      help="fraction of segments lost for the receive buffer")
+    (options, args) = parser.parse_args()
+
+    print("%-20s %10s %10s %14s" % ("Buffer", "Megabytes", "Seconds", "Megabytes/second"))
+    for megabytes in [int(s) for s in options.sizes.split(',')]:
+        data = os.urandom(megabytes * 1000000)
+        for buffer_class in (StringSendBuffer, SendBuffer):
+            start = timeit.default_timer()
+            sent = transfer(buffer_class, data, options.window)
+            elapsed = timeit.default_timer() - start
+            assert sent == len(data)
+            print("%-20s %10d %10.3f %14.1f" % (buffer_class.__name__, megabytes, elapsed, megabytes / elapsed))
+        for buffer_class in (SortedReceiveBuffer, ReceiveBuffer):
+            start = timeit.default_timer()
+            received = receive(buffer_class, data, options.receive_window, options.loss)
+            elapsed = timeit.default_timer() - start
+            assert received == len(data)
+            print("%-20s %10d %10.3f %14.1f" % (buffer_class.__name__, megabytes, elapsed, megabytes / elapsed))
+
+
+if __name__ == '__main__':
+    main()
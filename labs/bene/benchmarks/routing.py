@@ -0,0 +1,86 @@
+from __future__ import print_function
+
+import sys
+
+sys.path.append('..')
+
+from src.sim import Sim
+from src.linkstate import LinkState
+from lab5.routing import DeltaBroadcastApp
+
+from networks import generators
+from networks.network import Network
+
+import optparse
+import random
+import timeit
+
+
+class DistanceVector(object):
+    """ The distance-vector engine of lab5, with the same interface as
+        LinkState for this benchmark. """
+
+    def __init__(self, node):
+        self.app = DeltaBroadcastApp(node)
+        node.add_protocol(protocol="broadcast", handler=self.app)
+        node.init_routing()
+
+    def start(self, event=None):
+        self.app.broadcast(0)
+
+    @property
+    def updated(self):
+        return self.app.node.get_distance_vector_time()
+
+
+def converge(engine, options):
+    """ Route a random graph with the given engine, then fail a link, and
+        return the simulated time each took to converge and the wall clock
+        time spent simulating it. """
+    Sim.reset()
+    net = Network(generators.barabasi_albert(options.nodes, options.edges, seed=options.seed))
+    routers = []
+    for n in net.nodes.values():
+        r = engine(n)
+        routers.append(r)
+        Sim.scheduler.add(delay=0, event=None, handler=r.start)
+
+    start = timeit.default_timer()
+    Sim.scheduler.run(until=options.horizon)
+    results = [max(r.updated for r in routers), timeit.default_timer() - start]
+
+    # take down both directions of a random connection
+    link = random.Random(options.seed).choice(list(net.links.values()))
+    back = net.get_link_between(link.endpoint.hostname, link.startpoint.hostname)
+    failure = Sim.scheduler.current_time()
+    Sim.scheduler.add(delay=0, event=None, handler=link.down)
+    Sim.scheduler.add(delay=0, event=None, handler=back.down)
+    start = timeit.default_timer()
+    Sim.scheduler.run(until=failure + options.horizon)
+    results += [max(r.updated for r in routers) - failure, timeit.default_timer() - start]
+    return results
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option("-n", "--nodes", type="int", dest="nodes",
+                      default=200,
+                      help="number of nodes")
+    parser.add_option("-m", "--edges", type="int", dest="edges",
+                      default=2,
+                      help="connections made by each new node")
+    parser.add_option("-s", "--seed", type="int", dest="seed",
+                      default=1,
+                      help="seed for the graph and the failed link")
+    parser.add_option("-t", "--horizon", type="float", dest="horizon",
+                      default=60,
+                      help="simulated seconds to run before and after the failure")
+    (options, args) = parser.parse_args()
+
+    print("%-16s %12s %10s %12s %10s" % ("Engine", "Converged", "Seconds", "Reconverged", "Seconds"))
+    for engine in (DistanceVector, LinkState):
+        print("%-16s %12.3f %10.3f %12.3f %10.3f" % ((engine.__name__,) + tuple(converge(engine, options))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+from __future__ import print_function
+
+import sys
+
+sys.path.append('..')
+
+from src.sim import Simulation
+from src.scheduler import Scheduler, CalendarScheduler
+from src.transport import Transport
+from lab3.tcp import TCP
+
+from networks.network import Network
+
+import itertools
+import optparse
+import sched
+import timeit
+
+
+class SchedScheduler(object):
+    """ The original scheduler, a thin wrapper around sched.scheduler,
+        kept here as the baseline for comparison. """
+
+    def __init__(self):
+        self.current = 0
+        self.count = itertools.count()
+        self.scheduler = sched.scheduler(self.current_time, self.advance_time)
+
+    def reset(self):
+        self.current = 0
+
+    def current_time(self):
+        return self.current
+
+    def advance_time(self, units):
+        self.current += units
+
+    def add(self, delay, event, handler):
+        return self.scheduler.enter(delay, next(self.count), handler, [event])
+
+    def cancel(self, event):
+        self.scheduler.cancel(event)
+
+    def run(self):
+        self.scheduler.run()
+
+
+class NullApp(object):
+    def __init__(self):
+        self.received = 0
+
+    def receive_data(self, data):
+        self.received += len(data)
+
+
+def transfer(sim, filename, window):
+    """ Run the lab3 one-hop file transfer in the given simulation. """
+    net = Network('../lab3/networks/one-hop.txt', sim=sim)
+
+    n1 = net.get_node('n1')
+    n2 = net.get_node('n2')
+    n1.add_forwarding_entry(address=n2.get_address('n1'), link=n1.links[0])
+    n2.add_forwarding_entry(address=n1.get_address('n2'), link=n2.links[0])
+
+    t1 = Transport(n1)
+    t2 = Transport(n2)
+    a = NullApp()
+    c1 = TCP(t1, n1.get_address('n2'), 1, n2.get_address('n1'), 1, a, window=window)
+    TCP(t2, n2.get_address('n1'), 1, n1.get_address('n2'), 1, a, window=window)
+
+    with open(filename, 'rb') as f:
+        while True:
+            data = f.read(1000)
+            if not data:
+                break
+            sim.scheduler.add(delay=0, event=data, handler=c1.send)
+
+    sim.scheduler.run()
+    return a.received
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option("-f", "--filename", type="str", dest="filename",
+                      default='../lab3/internet-architecture.pdf',
+                      help="filename to send")
+    parser.add_option("-w", "--window", type="int", dest="window",
+                      default=20000,
+                      help="window size in bytes")
+    parser.add_option("-r", "--repeat", type="int", dest="repeat",
+                      default=5,
+                      help="number of runs per scheduler")
+    (options, args) = parser.parse_args()
+
+    print("%-20s %10s %10s %14s" % ("Scheduler", "Events", "Seconds", "Events/second"))
+    for scheduler in (SchedScheduler, Scheduler, CalendarScheduler):
+        best = None
+        for _ in range(options.repeat):
+            sim = Simulation(scheduler)
+            start = timeit.default_timer()
+            transfer(sim, options.filename, options.window)
+            elapsed = timeit.default_timer() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        # every add() draws one number from the counter
+        events = next(sim.scheduler.count)
+        print("%-20s %10d %10.3f %14.0f" % (scheduler.__name__, events, best, events / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -9,7 +9,6 @@ from src.packet import Packet
 
 from networks.network import Network
 
-import random
 
 
 class Generator(object):
@@ -17,6 +16,7 @@ class Generator(object):
         self.node = node
         self.load = load
         self.destination = destination
+        self.random = Sim.random.stream('generator', node.hostname)
         self.duration = duration
         self.start = 0
         self.ident = 1
@@ -32,7 +32,7 @@ class Generator(object):
         p = Packet(destination_address=self.destination, ident=self.ident, protocol='delay', length=1000)
         Sim.scheduler.add(delay=0, event=p, handler=self.node.send_packet)
         # schedule the next time we should generate a packet
-        Sim.scheduler.add(delay=random.expovariate(self.load), event='generate', handler=self.handle)
+        Sim.scheduler.add(delay=self.random.expovariate(self.load), event='generate', handler=self.handle)
 
 
 class DelayHandler(object):
@@ -0,0 +1,84 @@
+from __future__ import print_function
+
+import sys
+
+sys.path.append('..')
+
+from src.sim import Simulation
+from src.transport import Transport
+from lab3.tcp import TCP
+
+from networks import generators
+from networks.network import Network
+
+import optparse
+
+
+class Counter(object):
+    def __init__(self):
+        self.received = 0
+
+    def receive_data(self, data):
+        self.received += len(data)
+
+
+def throughput(multipath, options):
+    """ Send a TCP flow from each host of one half of a fat tree to a host
+        in the other half, and return the total rate they get in bits per
+        second. """
+    sim = Simulation(seed=options.seed)
+    net = Network(generators.fat_tree(options.k, bandwidth=options.bandwidth, propagation=0.001,
+                                      queue_size=options.queue), sim=sim)
+    net.route(multipath=multipath)
+
+    hosts = sorted((n for n in net.nodes.values() if n.hostname.startswith('h')),
+                   key=lambda n: int(n.hostname[1:]))
+    transports = {}
+    half = len(hosts) // 2
+    counters = []
+    for i in range(half):
+        source, destination = hosts[i], hosts[i + half]
+        for n in (source, destination):
+            if n.hostname not in transports:
+                transports[n.hostname] = Transport(n)
+        source_address = next(iter(source.addresses))
+        destination_address = next(iter(destination.addresses))
+        counter = Counter()
+        counters.append(counter)
+        c = TCP(transports[source.hostname], source_address, i + 1, destination_address, i + 1,
+                window=options.window)
+        TCP(transports[destination.hostname], destination_address, i + 1, source_address, i + 1,
+            counter, window=options.window)
+        sim.scheduler.add(delay=0, event=b'x' * options.size, handler=c.send)
+
+    sim.scheduler.run(until=options.duration)
+    return 8.0 * sum(c.received for c in counters) / options.duration
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option("-k", type="int", dest="k", default=4,
+                      help="ports per switch in the fat tree")
+    parser.add_option("-b", "--bandwidth", type="float", dest="bandwidth", default=10000000,
+                      help="bandwidth of every link, in bits per second")
+    parser.add_option("-q", "--queue", type="int", dest="queue", default=1000,
+                      help="queue size of every link, in packets")
+    parser.add_option("-w", "--window", type="int", dest="window", default=20000,
+                      help="window size in bytes")
+    parser.add_option("-s", "--size", type="int", dest="size", default=3000000,
+                      help="bytes each flow has to send")
+    parser.add_option("-d", "--duration", type="float", dest="duration", default=3,
+                      help="simulated seconds to run")
+    parser.add_option("--seed", type="int", dest="seed", default=1,
+                      help="seed for the simulation")
+    (options, args) = parser.parse_args()
+
+    single = throughput(False, options)
+    multiple = throughput(True, options)
+    print("single path: %.2f Mbps" % (single / 1000000))
+    print("multipath:   %.2f Mbps" % (multiple / 1000000))
+    print("gain:        %.2fx" % (multiple / single))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+from __future__ import print_function
+
+import sys
+
+sys.path.append('..')
+
+from src.packet import Packet
+
+from networks.sweep import Sweep
+
+import optparse
+
+
+class Generator(object):
+    def __init__(self, node, destination, load):
+        self.node = node
+        self.destination = destination
+        self.random = node.sim.random.stream('generator', node.hostname)
+        self.load = load
+        self.ident = 0
+
+    def handle(self, event):
+        # generate a packet
+        self.ident += 1
+        p = Packet(destination_address=self.destination, ident=self.ident, protocol='delay', length=1000)
+        self.node.sim.scheduler.add(delay=0, event=p, handler=self.node.send_packet)
+        # schedule the next time we should generate a packet
+        self.node.sim.scheduler.add(delay=self.random.expovariate(self.load), event='generate', handler=self.handle)
+
+
+class DelayHandler(object):
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+
+    def receive_packet(self, packet):
+        self.count += 1
+        self.total += packet.queueing_delay
+
+
+def queueing_delay(sim, net, params):
+    """ Measure the average queueing delay over a one-hop link driven at
+        the given utilization. """
+    n1 = net.get_node('n1')
+    n2 = net.get_node('n2')
+    n1.add_forwarding_entry(address=n2.get_address('n1'), link=n1.links[0])
+
+    d = DelayHandler()
+    n2.add_protocol(protocol="delay", handler=d)
+
+    max_rate = n1.links[0].bandwidth / (1000 * 8)
+    g = Generator(n1, n2.get_address('n1'), params['utilization'] * max_rate)
+    sim.scheduler.add(delay=0, event='generate', handler=g.handle)
+    sim.scheduler.run(until=params['duration'])
+
+    return {'packets': d.count, 'delay': d.total / d.count if d.count else 0}
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option("-o", "--output", type="str", dest="output",
+                      default='sweep.csv',
+                      help="results file")
+    parser.add_option("-j", "--workers", type="int", dest="workers",
+                      default=None,
+                      help="number of worker processes")
+    parser.add_option("-c", "--cache", type="str", dest="cache",
+                      default=None,
+                      help="directory for compiled network configurations")
+    (options, args) = parser.parse_args()
+
+    grid = {
+        'utilization': [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.84, 0.88, 0.9, 0.92, 0.96, 0.98],
+        'duration': [10],
+        'seed': [1, 2, 3],
+    }
+    sweep = Sweep('../networks/one-hop.txt', queueing_delay, grid, options.output, workers=options.workers,
+                  cache=options.cache)
+    print("wrote %d runs to %s" % (sweep.run(), options.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,24 +7,22 @@ The below python script code collects data on network speeds and queuing delays,
 plots the data.
 """
 from src.packet import Packet
-from src.sim import Sim
+from src.sim import Simulation
 from networks.network import Network
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
-import random
 
 
 class Generator(object):
     """
     Class that generates packet events exponentially to model queuing delay
     """
-    def __init__(self, node, destination, load, duration):
+    def __init__(self, node, destination, load):
         self.node = node
         self.load = load
         self.destination = destination
-        self.duration = duration
-        self.start = 0
+        self.random = node.sim.random.stream('generator', node.hostname)
         self.ident = 1
 
     def handle(self, event):
@@ -34,24 +32,20 @@ class Generator(object):
         of the network.
         :param event: Not used, needed to use this method as the hook for handling an event in the simulator
         """
-        # quit if done
-        now = Sim.scheduler.current_time()
-        if (now - self.start) > self.duration:
-            return
-
         # generate a packet
         self.ident += 1
         p = Packet(destination_address=self.destination, ident=self.ident, protocol='delay', length=1000)
-        Sim.scheduler.add(delay=0, event=p, handler=self.node.send_packet)
+        self.node.sim.scheduler.add(delay=0, event=p, handler=self.node.send_packet)
         # schedule the next time we should generate a packet
-        Sim.scheduler.add(delay=random.expovariate(self.load), event='generate', handler=self.handle)
+        self.node.sim.scheduler.add(delay=self.random.expovariate(self.load), event='generate', handler=self.handle)
 
 
 class DataWrangler(object):
     """
     The handler object used by packets when they are received by a node in the simulator
     """
-    def __init__(self, utilization):
+    def __init__(self, sim, utilization):
+        self.sim = sim
         self.packet_info = pd.DataFrame(columns=['packet_id','util','create_time','receive_time'])
         self.utilization = utilization
 
@@ -63,7 +57,7 @@ class DataWrangler(object):
         :param packet: The packet received by the node in the simulator
         """
         # Formatted as Packet ID, Utilization, Create Time, Receive Time
-        received_time = Sim.scheduler.current_time() - packet.created
+        received_time = self.sim.scheduler.current_time() - packet.created
         self.packet_info.loc[self.packet_info.size] = [packet.ident, self.utilization, packet.created,
                                                        received_time]
 
@@ -132,7 +126,7 @@ def plot(avg_csv_file, t_csv_file):
 #u = 0.100
 #formula = lambda y : (1 / (2 * l)) * (y / (1.0 - y)) + 0.1
 
-def run_simulation(network_file, output_file, utilization=1.0):
+def run_simulation(network_file, output_file, utilization=1.0, duration=10):
     """
     Abstracted method to run a simulation of queuing delay at a specified utilization for the network. Using a network
     configuration file, it creates a network and then writes the results of the simulation to the provided output
@@ -141,10 +135,12 @@ def run_simulation(network_file, output_file, utilization=1.0):
     :param output_file: The path to the file to write the result networks to
     :param utilization: A floating point number that specifies at what percentage of the maximum transfer rate the
                         simulation should run the network
+    :param duration: The simulated time, in seconds, at which the simulation stops
     """
-    Sim.scheduler.reset()
+    # each run gets its own simulation, so there is nothing to reset
+    sim = Simulation()
 
-    network = Network(network_file)
+    network = Network(network_file, sim=sim)
 
     # setup routes
     n1 = network.get_node('n1')
@@ -153,7 +149,7 @@ def run_simulation(network_file, output_file, utilization=1.0):
     n2.add_forwarding_entry(address=n1.get_address('n2'), link=n2.links[0])
 
     # setup app
-    d = DataWrangler(utilization)
+    d = DataWrangler(sim, utilization)
     network.nodes['n2'].add_protocol(protocol="delay", handler=d)
 
     # setup packet generator
@@ -161,11 +157,11 @@ def run_simulation(network_file, output_file, utilization=1.0):
     packet_size = 1000
     max_rate = n1.links[0].bandwidth /  (packet_size * 8)
     load = utilization * max_rate
-    g = Generator(node=n1, destination=destination, load=load, duration=10)
-    Sim.scheduler.add(delay=0, event='generate', handler=g.handle)
+    g = Generator(node=n1, destination=destination, load=load)
+    sim.scheduler.add(delay=0, event='generate', handler=g.handle)
 
-    # run the simulation
-    Sim.scheduler.run()
+    # run the simulation up to the horizon
+    sim.scheduler.run(until=duration)
 
     d.write_to_file(output_file)
 
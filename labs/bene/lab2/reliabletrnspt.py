@@ -31,7 +31,7 @@ class AppHandler(object):
         self.f = open(os.path.join(self.directory, self.filename), 'wb')
 
     def receive_data(self, data):
-        Sim.trace('AppHandler', "application got %d bytes" % (len(data)))
+        Sim.trace('AppHandler', "application got %d bytes", len(data))
         self.f.write(data)
         self.f.flush()
 
@@ -89,7 +89,7 @@ class Main(object):
         Sim.scheduler.reset()
         Sim.set_debug('AppHandler')
         Sim.set_debug('TCP')
-        Sim.set_debug('Plot')
+        Sim.recorder.select('n1')
 
         # setup network
         net = Network('./networks/one-hop.txt')
@@ -127,6 +127,7 @@ class Main(object):
 
         # run the simulation
         Sim.scheduler.run()
+        Sim.close()
 
 
 if __name__ == '__main__':
@@ -1,6 +1,5 @@
 from src.buffer import SendBuffer, ReceiveBuffer
 from src.connection import Connection
-from src.sim import Sim
 from src.tcppacket import TCPPacket
 
 
@@ -11,6 +10,10 @@ class TCP(Connection):
                  destination_address, destination_port, app=None, window=1000,drop=[]):
         Connection.__init__(self, transport, source_address, source_port,
                             destination_address, destination_port, app)
+        # debugging messages
+        self.trace = self.sim.tracer("TCP")
+        # free list of packets, shared by the connections in the simulation
+        self.pool = self.sim.pool(TCPPacket)
 
         # -- Sender functionality
 
@@ -51,17 +54,12 @@ class TCP(Connection):
         # number not yet received
         self.ack = 0
 
-    def trace(self, message):
-        """ Print debugging messages. """
-        Sim.trace("TCP", message)
-
     def plot_sequence_header(self):
-        if self.node.hostname =='n1':
-            Sim.plot('sequence.csv','Time,Sequence Number,Event\n')
+        self.entity = self.sim.recorder.entity('%s:%d' % (self.node.hostname, self.source_port), self.node.hostname)
+        self.sim.recorder.channel('sequence', ('Sequence Number',))
 
     def plot_sequence(self,sequence,event):
-        if self.node.hostname =='n1':
-            Sim.plot('sequence.csv','%s,%s,%s\n' % (Sim.scheduler.current_time(),sequence,event))
+        self.sim.recorder.record('sequence', self.entity, event, sequence)
 
     def receive_packet(self, packet):
         """ Receive a packet from the network layer. """
@@ -71,6 +69,8 @@ class TCP(Connection):
         if packet.length > 0:
             # handle networks
             self.handle_data(packet)
+        # nothing holds on to a segment once it is handled
+        self.pool.release(packet)
 
     def set_fast_retransmit_enabled(self, val):
         self.fast_enable = val
@@ -89,38 +89,38 @@ class TCP(Connection):
             self.send_packet(send_data, sequence)
             # set a timer
             if self.timer is None:
-                self.timer = Sim.scheduler.add(delay=self.timeout, event='retransmit', handler=self.retransmit)
+                self.timer = self.sim.timers.add(delay=self.timeout, event='retransmit', handler=self.retransmit)
 
     def send_packet(self, data, sequence):
-        packet = TCPPacket(source_address=self.source_address,
-                           source_port=self.source_port,
-                           destination_address=self.destination_address,
-                           destination_port=self.destination_port,
-                           body=data,
-                           sequence=sequence, ack_number=self.ack)
+        packet = self.pool.get(source_address=self.source_address,
+                               source_port=self.source_port,
+                               destination_address=self.destination_address,
+                               destination_port=self.destination_port,
+                               body=data,
+                               sequence=sequence, ack_number=self.ack)
 
         if sequence in self.drop and not sequence in self.dropped:
             self.dropped.append(sequence)
             self.plot_sequence(sequence,'drop')
-            self.trace("%s (%d) dropping TCP segment to %d for %d" % (
-                self.node.hostname, self.source_address, self.destination_address, packet.sequence))
+            self.trace("%s (%d) dropping TCP segment to %d for %d",
+                self.node.hostname, self.source_address, self.destination_address, packet.sequence)
             return
 
         # send the packet
         self.plot_sequence(sequence,'send')
-        self.trace("%s (%d) sending TCP segment to %d for %d" % (
-            self.node.hostname, self.source_address, self.destination_address, packet.sequence))
+        self.trace("%s (%d) sending TCP segment to %d for %d",
+            self.node.hostname, self.source_address, self.destination_address, packet.sequence)
         self.transport.send_packet(packet)
 
         # set a timer
         if self.timer is None:
-            self.timer = Sim.scheduler.add(delay=self.timeout, event='retransmit', handler=self.retransmit)
+            self.timer = self.sim.timers.add(delay=self.timeout, event='retransmit', handler=self.retransmit)
 
     def handle_ack(self, packet):
         """ Handle an incoming ACK. """
         self.plot_sequence(packet.ack_number - 1000,'ack')
-        self.trace("%s (%d) received ACK from %d for %d" % (
-            self.node.hostname, packet.destination_address, packet.source_address, packet.ack_number))
+        self.trace("%s (%d) received ACK from %d for %d",
+            self.node.hostname, packet.destination_address, packet.source_address, packet.ack_number)
 
         # Handle fast retransmit
         if self.fast_enable:
@@ -148,10 +148,10 @@ class TCP(Connection):
         # Calculate the SRTT and RTTVAR
         if self.srtt == 0:
             # First estimate
-            self.srtt = Sim.scheduler.current_time() - packet.created
+            self.srtt = self.sim.scheduler.current_time() - packet.created
             self.rttvar = self.srtt / 2.0
         else:
-            r = Sim.scheduler.current_time() - packet.created
+            r = self.sim.scheduler.current_time() - packet.created
             alpha = 0.125
             beta = 0.25
             self.rttvar = (1 - beta) * self.rttvar + beta * abs(self.srtt - r)
@@ -162,24 +162,24 @@ class TCP(Connection):
 
         self.cancel_timer()
         if self.send_buffer.outstanding() != 0:
-            self.timer = Sim.scheduler.add(delay=self.timeout, event='retransmit', handler=self.retransmit)
+            self.timer = self.sim.timers.add(delay=self.timeout, event='retransmit', handler=self.retransmit)
 
     def fast_retransmit(self, packet):
         """ Retransmit networks. """
-        self.trace("%s (%d) sending fast retransmit to %d for %d" % (
-            self.node.hostname, packet.destination_address, packet.source_address, packet.ack_number))
+        self.trace("%s (%d) sending fast retransmit to %d for %d",
+            self.node.hostname, packet.destination_address, packet.source_address, packet.ack_number)
         self.cancel_timer()
         data, sequence = self.send_buffer.resend(self.mss)
         if len(data) == 0:
             return
         self.send_packet(data, sequence)
         if self.timer is None:
-            self.timer = Sim.scheduler.add(delay=self.timeout, event='retransmit', handler=self.retransmit)
+            self.timer = self.sim.timers.add(delay=self.timeout, event='retransmit', handler=self.retransmit)
         self.fast_retransmitted = True
 
     def retransmit(self, event):
         """ Retransmit networks. """
-        self.trace("%s (%d) retransmission timer fired" % (self.node.hostname, self.source_address))
+        self.trace("%s (%d) retransmission timer fired", self.node.hostname, self.source_address)
         data, sequence = self.send_buffer.resend(self.mss)
         # Handle the case when we get a misfire on retransmission and their isn't any data left
         # in the send buffer
@@ -187,14 +187,14 @@ class TCP(Connection):
             self.cancel_timer()
             return
         self.send_packet(data, sequence)
-        self.timer = Sim.scheduler.add(delay=self.rto, event='retransmit', handler=self.retransmit)
+        self.timer = self.sim.timers.add(delay=self.rto, event='retransmit', handler=self.retransmit)
 
 
     def cancel_timer(self):
         """ Cancel the timer. """
         if self.timer is None:
             return
-        Sim.scheduler.cancel(self.timer)
+        self.sim.timers.cancel(self.timer)
         self.timer = None
 
     ''' Receiver '''
@@ -203,8 +203,8 @@ class TCP(Connection):
         """ Handle incoming networks. This code currently gives all networks to
             the application, regardless of whether it is in order, and sends
             an ACK."""
-        self.trace("%s (%d) received TCP segment from %d for %d" % (
-            self.node.hostname, packet.destination_address, packet.source_address, packet.sequence))
+        self.trace("%s (%d) received TCP segment from %d for %d",
+            self.node.hostname, packet.destination_address, packet.source_address, packet.sequence)
         self.receive_buffer.put(packet.body, packet.sequence)
         data, start_sequence = self.receive_buffer.get()
         self.app.receive_data(data)
@@ -213,12 +213,12 @@ class TCP(Connection):
 
     def send_ack(self):
         """ Send an ack. """
-        packet = TCPPacket(source_address=self.source_address,
-                           source_port=self.source_port,
-                           destination_address=self.destination_address,
-                           destination_port=self.destination_port,
-                           sequence=self.sequence, ack_number=self.ack)
+        packet = self.pool.get(source_address=self.source_address,
+                               source_port=self.source_port,
+                               destination_address=self.destination_address,
+                               destination_port=self.destination_port,
+                               sequence=self.sequence, ack_number=self.ack)
         # send the packet
-        self.trace("%s (%d) sending TCP ACK to %d for %d" % (
-            self.node.hostname, self.source_address, self.destination_address, packet.ack_number))
+        self.trace("%s (%d) sending TCP ACK to %d for %d",
+            self.node.hostname, self.source_address, self.destination_address, packet.ack_number)
         self.transport.send_packet(packet)
@@ -1,5 +1,6 @@
 from __future__ import print_function
 
+import optparse
 import sys
 
 sys.path.append('..')
@@ -13,6 +14,9 @@ from networks.network import Network
 class BroadcastApp(object):
     def __init__(self, node):
         self.node = node
+        # routing packets and vector entries sent
+        self.packets = 0
+        self.entries = 0
 
     def receive_packet(self, packet):
         change = self.node.update_distance_vector(packet.body["hostname"], packet.body["dv"])
@@ -31,14 +35,91 @@ class BroadcastApp(object):
             delay = 1
 
         # Setup new event to rebroadcast
+        Sim.scheduler.add(delay=delay, event=0, handler=self.broadcast)
+
+    def broadcast(self, ident):
+        # Packet bodies are shared by every copy of a broadcast, so send a
+        # snapshot of the distance vector, taken when it is sent
         pbody = {
             "hostname": self.node.hostname,
-            "dv": self.node.get_distance_vector()
+            "dv": dict(self.node.get_distance_vector())
         }
+        self.packets += 1
+        self.entries += len(pbody["dv"])
         p = Packet(
             destination_address=0,
-            ident=0, ttl=1, protocol='broadcast', body=pbody)
-        Sim.scheduler.add(delay=delay, event=p, handler=self.node.send_packet)
+            ident=ident, ttl=1, protocol='broadcast', body=pbody)
+        self.node.send_packet(p)
+
+
+class DeltaBroadcastApp(object):
+    """
+    Distance vector routing with triggered incremental updates. When a node's vector changes, it sends only the
+    changed entries, soon after the change, and it sends its whole vector every refresh seconds so that neighbors
+    that missed an update catch up. Every update is numbered, so a neighbor can tell when it has missed one. A
+    neighbor not heard from for timeout seconds is dropped.
+    """
+    def __init__(self, node, refresh=5, timeout=15, hold=0.5):
+        self.node = node
+        self.refresh = refresh
+        self.timeout = timeout
+        # how long to gather changes before sending them
+        self.hold = hold
+        self.sequence = 0
+        self.pending = False
+        # routing packets and vector entries sent
+        self.packets = 0
+        self.entries = 0
+
+    def receive_packet(self, packet):
+        body = packet.body
+        change = self.node.update_distance_vector(body["hostname"], body["dv"], body["sequence"], body["delta"])
+        change = self.expire() or change
+        if change:
+            self.trigger()
+
+    def expire(self):
+        # Drop the vectors of neighbors we have not heard from in a while
+        change = False
+        now = Sim.scheduler.current_time()
+        for host in list(self.node.distance_vectors):
+            if host != self.node.hostname and now - self.node.get_distance_vector_time(host) > self.timeout:
+                change = self.node.remove_distance_vector(host) or change
+        return change
+
+    def trigger(self):
+        if not self.pending:
+            self.pending = True
+            Sim.scheduler.add(delay=self.hold, event=None, handler=self.send_changes)
+
+    def send_changes(self, event):
+        self.pending = False
+        delta = self.node.take_distance_vector_changes()
+        if delta:
+            self.send(delta, True)
+
+    def broadcast(self, ident):
+        # Send the whole vector, which includes any changes not yet sent
+        if self.expire():
+            self.trigger()
+        self.node.take_distance_vector_changes()
+        self.send(dict(self.node.get_distance_vector()), False)
+        Sim.scheduler.add(delay=self.refresh, event=ident, handler=self.broadcast)
+
+    def send(self, vector, delta):
+        self.sequence += 1
+        self.packets += 1
+        self.entries += len(vector)
+        pbody = {
+            "hostname": self.node.hostname,
+            "sequence": self.sequence,
+            "delta": delta,
+            "dv": vector
+        }
+        p = Packet(
+            destination_address=0,
+            ident=self.sequence, ttl=1, protocol='broadcast', body=pbody)
+        self.node.send_packet(p)
 
 
 class FileWriter(object):
@@ -107,6 +188,13 @@ class PacketHandler(object):
 
 def main():
     # parameters
+    parser = optparse.OptionParser(usage="%prog [options]", version="%prog 0.1")
+    parser.add_option("-d", "--delta", action="store_true", dest="delta", default=False,
+                      help="send triggered incremental updates with a periodic full refresh")
+    parser.add_option("-m", "--multipath", action="store_true", dest="multipath", default=False,
+                      help="route through every neighbor on a shortest path")
+    (options, args) = parser.parse_args()
+
     Sim.scheduler.reset()
 
     # setup network
@@ -116,20 +204,15 @@ def main():
 
     # Setup broadcast protocol for all nodes in the network
     packet_count = 1
-    for k, n in net.nodes.iteritems():
-        b = BroadcastApp(n)
+    apps = []
+    for k, n in net.nodes.items():
+        b = DeltaBroadcastApp(n) if options.delta else BroadcastApp(n)
+        apps.append(b)
         ph = PacketHandler(k)
         n.add_protocol(protocol="broadcast", handler=b)
         n.add_protocol(protocol="transmit", handler=ph)
-        n.init_routing()
-        pbody = {
-            "hostname": n.hostname,
-            "dv": n.get_distance_vector()
-        }
-        p = Packet(
-            destination_address=0,
-            ident=packet_count, ttl=1, protocol='broadcast', body=pbody)
-        Sim.scheduler.add(delay=0, event=p, handler=n.send_packet)
+        n.init_routing(multipath=options.multipath)
+        Sim.scheduler.add(delay=0, event=packet_count, handler=b.broadcast)
         packet_count = packet_count + 1
 
     # Send a packet after everything has been setup
@@ -158,8 +241,11 @@ def main():
         Sim.scheduler.add(delay=40, event=p, handler=n1.send_packet)
 
 
-    # run the simulation
-    Sim.scheduler.run()
+    # run the simulation; the routing protocol never goes quiet, so stop
+    # at a horizon after the last test packet
+    Sim.scheduler.run(until=50)
+    print("Routing packets sent:", sum(b.packets for b in apps),
+          "entries:", sum(b.entries for b in apps))
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,197 @@
+import math
+import random
+
+from networks.topology import Topology
+
+# Generators of common topologies, built in memory rather than read from a
+# configuration file. Each returns a Topology that can be given to Network
+# in place of a file name:
+#
+#   net = Network(generators.grid(100, 100, bandwidth=10000000, propagation=0.001))
+#
+# Every connection is a pair of links, one in each direction, and nodes are
+# named n1, n2 and so on unless noted otherwise. Link settings are given as
+# keyword arguments named after link attributes: bandwidth (bits per
+# second), propagation (seconds), queue_size (packets), queue_bytes, loss
+# and discipline. Each is either a value or a distribution, a function that
+# is called with a random stream once per connection, so both directions of
+# a connection share a value. Random choices, including those made by the
+# random graph generators, come from a stream seeded with seed.
+
+
+def uniform(low, high):
+    """ A distribution of values drawn uniformly between low and high. """
+    return lambda r: r.uniform(low, high)
+
+
+def choice(*values):
+    """ A distribution of values drawn with equal probability from the
+        ones given. """
+    return lambda r: r.choice(values)
+
+
+def exponential(mean):
+    """ A distribution of values drawn exponentially with the given mean. """
+    return lambda r: r.expovariate(1.0 / mean)
+
+
+def nodes(topology, count, prefix='n'):
+    return [topology.add_node('%s%d' % (prefix, i + 1)) for i in range(count)]
+
+
+def configure(topology, connections, stream, settings):
+    """ Apply settings to the connections, given by the index of their
+        first link. """
+    for setting in sorted(settings):
+        value = settings[setting]
+        if value is None:
+            continue
+        if not callable(value):
+            topology.configure([l for c in connections for l in (c, c + 1)], setting, value)
+            continue
+        for c in connections:
+            topology.configure((c, c + 1), setting, value(stream))
+
+
+def build(topology, connections, seed, settings):
+    configure(topology, connections, random.Random(seed), settings)
+    return topology
+
+
+def line(n, seed=None, **settings):
+    """ n nodes in a line. """
+    t = Topology()
+    v = nodes(t, n)
+    connections = [t.connect(v[i], v[i + 1]) for i in range(n - 1)]
+    return build(t, connections, seed, settings)
+
+
+def ring(n, seed=None, **settings):
+    """ n nodes in a ring. """
+    t = Topology()
+    v = nodes(t, n)
+    connections = [t.connect(v[i], v[(i + 1) % n]) for i in range(n)]
+    return build(t, connections, seed, settings)
+
+
+def star(n, seed=None, **settings):
+    """ n nodes, with n1 as the hub connected to every other node. """
+    t = Topology()
+    v = nodes(t, n)
+    connections = [t.connect(v[0], v[i]) for i in range(1, n)]
+    return build(t, connections, seed, settings)
+
+
+def grid(rows, columns, seed=None, **settings):
+    """ A rows by columns grid, numbered row by row, with each node
+        connected to the nodes beside, above and below it. """
+    t = Topology()
+    v = nodes(t, rows * columns)
+    connections = []
+    for row in range(rows):
+        for column in range(columns):
+            i = row * columns + column
+            if column + 1 < columns:
+                connections.append(t.connect(v[i], v[i + 1]))
+            if row + 1 < rows:
+                connections.append(t.connect(v[i], v[i + columns]))
+    return build(t, connections, seed, settings)
+
+
+def fat_tree(k, seed=None, **settings):
+    """ A k-ary fat tree (Al-Fares et al., 2008), for even k: (k/2)^2 core
+        switches c1, c2, ..., and k pods of k/2 aggregation switches a1,
+        a2, ... and k/2 edge switches e1, e2, ..., each edge switch with
+        k/2 hosts h1, h2, .... """
+    if k % 2:
+        raise ValueError("a fat tree needs an even k, not %d" % k)
+    half = k // 2
+    t = Topology()
+    core = nodes(t, half * half, 'c')
+    aggregation = nodes(t, k * half, 'a')
+    edge = nodes(t, k * half, 'e')
+    hosts = nodes(t, k * half * half, 'h')
+    connections = []
+    for pod in range(k):
+        for i in range(half):
+            a = aggregation[pod * half + i]
+            # aggregation switch i of every pod connects to core group i
+            for j in range(half):
+                connections.append(t.connect(a, core[i * half + j]))
+            for j in range(half):
+                connections.append(t.connect(a, edge[pod * half + j]))
+        for i in range(half):
+            e = pod * half + i
+            for j in range(half):
+                connections.append(t.connect(edge[e], hosts[e * half + j]))
+    return build(t, connections, seed, settings)
+
+
+def dumbbell(pairs, bottleneck=None, seed=None, **settings):
+    """ Two routers r1 and r2 joined by a bottleneck, with senders s1, s2,
+        ... on r1 and as many receivers d1, d2, ... on r2. bottleneck is a
+        dictionary of settings for the connection between the routers,
+        used in place of the others. """
+    t = Topology()
+    r1, r2 = nodes(t, 2, 'r')
+    senders = nodes(t, pairs, 's')
+    receivers = nodes(t, pairs, 'd')
+    middle = t.connect(r1, r2)
+    connections = [t.connect(r1, s) for s in senders] + [t.connect(r2, d) for d in receivers]
+    stream = random.Random(seed)
+    configure(t, connections, stream, settings)
+    specific = dict(settings)
+    specific.update(bottleneck or {})
+    configure(t, [middle], stream, specific)
+    return t
+
+
+def waxman(n, alpha=0.4, beta=0.1, seed=None, **settings):
+    """ A Waxman random graph (Waxman, 1988): n nodes placed uniformly at
+        random in the unit square, with each pair connected with
+        probability beta * exp(-d / (alpha * L)), where d is their distance
+        and L the largest possible distance. Every pair is considered, so
+        this takes time quadratic in n, and the graph may not be
+        connected. """
+    stream = random.Random(seed)
+    t = Topology()
+    v = nodes(t, n)
+    x = [stream.random() for _ in v]
+    y = [stream.random() for _ in v]
+    scale = alpha * math.sqrt(2)
+    connections = []
+    for i in range(n):
+        for j in range(i + 1, n):
+            d = math.hypot(x[i] - x[j], y[i] - y[j])
+            if stream.random() < beta * math.exp(-d / scale):
+                connections.append(t.connect(v[i], v[j]))
+    configure(t, connections, stream, settings)
+    return t
+
+
+def barabasi_albert(n, m=2, seed=None, **settings):
+    """ A Barabasi-Albert preferential attachment graph (Barabasi and
+        Albert, 1999) of n nodes. The first m nodes start unconnected, and
+        each later node connects to m distinct earlier nodes, chosen with
+        probability proportional to their degree. """
+    if not 1 <= m < n:
+        raise ValueError("need 1 <= m < n, not m=%d and n=%d" % (m, n))
+    stream = random.Random(seed)
+    t = Topology()
+    v = nodes(t, n)
+    # every node appears once for each of its connections, so a uniform
+    # choice from this list is a choice proportional to degree
+    ends = []
+    targets = v[:m]
+    connections = []
+    for source in v[m:]:
+        for target in targets:
+            connections.append(t.connect(source, target))
+        ends.extend(targets)
+        ends.extend([source] * m)
+        chosen = set()
+        while len(chosen) < m:
+            chosen.add(stream.choice(ends))
+        targets = sorted(chosen)
+    configure(t, connections, stream, settings)
+    return t
@@ -4,67 +4,187 @@ import sys
 sys.path.append('..')
 
 from src.link import Link
+from src.metrics import METRICS, link_cost
 from src.node import Node
+from src.packetqueue import DISCIPLINES
+from src.sim import Sim
+
+from networks import paths
+from networks import topology
 
 
 class Network(object):
-    def __init__(self, config):
+    def __init__(self, config, sim=None, link_class=Link, cache=None, hierarchical=False):
+        # the simulation that every node and link in this network belongs to
+        self.sim = Sim if sim is None else sim
+        # the link engine, Link or AnalyticLink
+        self.link_class = link_class
         self.config = config
+        # directory of compiled topologies, or None to always parse
+        self.cache = cache
+        # whether to give each node an aligned block of addresses, all of
+        # the same size, for its links, so that routes can be kept as
+        # prefixes; otherwise links are numbered in the order they appear
+        self.hierarchical = hierarchical
         self.nodes = {}
+        # every link by its address, and by the names of its start and
+        # end nodes
+        self.links = {}
+        self.pairs = {}
         self.address = 1
         self.build()
 
     def build(self):
-        state = 'network'
-        with open(self.config) as f:
-            for line in f.readlines():
-                if line.startswith('#'):
-                    continue
-                if line.strip() == "":
-                    state = 'links'
-                if state == 'network':
-                    self.create_network(line)
-                elif state == 'links':
-                    self.configure_link(line)
-
-    def create_network(self, line):
-        fields = line.split()
-        if len(fields) < 2:
-            return
-        start = self.get_node(fields[0])
-        for i in range(1, len(fields)):
-            end = self.get_node(fields[i])
-            l = Link(self.address, start, endpoint=end)
-            self.address += 1
+        # config is the name of a configuration file, or a Topology built
+        # in memory, such as by one of the generators
+        if isinstance(self.config, topology.Topology):
+            t = self.config
+        else:
+            t = topology.load(self.config, DISCIPLINES, self.cache)
+        nodes = [self.get_node(name) for name in t.names]
+        if self.hierarchical:
+            degree = [0] * len(nodes)
+            for start, end in t.links:
+                degree[start] += 1
+            size = 1
+            while size < max(degree or [1]):
+                size *= 2
+            # the first block is left out, since it holds the broadcast
+            # address
+            for i, node in enumerate(nodes):
+                node.prefix = ((i + 1) * size, size)
+            following = [node.prefix[0] for node in nodes]
+        links = []
+        for start, end in t.links:
+            if self.hierarchical:
+                address = following[start]
+                following[start] += 1
+            else:
+                address = self.address
+            start, end = nodes[start], nodes[end]
+            l = self.link_class(address, start, endpoint=end)
+            self.links[l.address] = l
+            self.pairs.setdefault((start.hostname, end.hostname), l)
+            self.address = max(self.address, address + 1)
             start.add_link(l)
-
-    def configure_link(self, line):
-        fields = line.split()
-        if len(fields) < 3:
-            return
-        start = self.get_node(fields[0])
-        l = start.get_link(fields[1])
-        for i in range(2, len(fields)):
-            if fields[i].endswith("bps"):
-                self.set_bandwidth(l, fields[i])
-            if fields[i].endswith("ms"):
-                self.set_delay(l, fields[i])
-            if fields[i].endswith("seconds"):
-                self.set_delay(l, fields[i])
-            if fields[i].endswith("pkts"):
-                self.set_queue(l, fields[i])
-            if fields[i].endswith("loss"):
-                self.set_loss(l, fields[i])
+            links.append(l)
+        for link, setting, value in t.settings:
+            name = topology.SETTINGS[setting]
+            if name == 'discipline':
+                links[link].set_discipline(t.disciplines[int(value)])
+            else:
+                setattr(links[link], name, value)
 
     def get_node(self, name):
         if name not in self.nodes:
-            self.nodes[name] = Node(name)
+            self.nodes[name] = Node(name, self.sim)
         return self.nodes[name]
 
-    def loss(self, loss):
-        for node in self.nodes.values():
-            for link in node.links:
-                link.loss = loss
+    def select(self, links=None):
+        """ Return a list of links given as a list of links or link
+            addresses, or every link if links is None. """
+        if links is None:
+            return list(self.links.values())
+        return [self.links[l] if isinstance(l, int) else l for l in links]
+
+    # -- Changing many links at once --
+    #
+    # Each takes the links to change as for select(). down and up take
+    # only the links, so they can be scheduled as event handlers with the
+    # links as the event.
+
+    def loss(self, loss, links=None):
+        for link in self.select(links):
+            link.loss = loss
+
+    def bandwidth(self, bandwidth, links=None):
+        for link in self.select(links):
+            link.bandwidth = bandwidth
+
+    def queue(self, size, links=None):
+        for link in self.select(links):
+            link.queue_size = size
+
+    def down(self, links=None):
+        for link in self.select(links):
+            link.down(None)
+
+    def up(self, links=None):
+        for link in self.select(links):
+            link.up(None)
+
+    # -- Static routing --
+
+    def route(self, metric='hops', multipath=False):
+        """ Find a shortest path between every pair of nodes over the
+            running links, and install the first hop of each in the
+            forwarding table of its source, replacing what the table held.
+            metric is a function giving the cost of a link, which must be
+            positive, or the name of one in METRICS. Of several links
+            between the same two nodes, the cheapest is used. In a
+            hierarchical network, each node gets one route to the prefix
+            of every other node, and the routes are then aggregated. With
+            multipath, every equal-cost next hop is used, through a shared
+            NextHopGroup at each node for each set of links. """
+        if not callable(metric):
+            metric = METRICS[metric]
+        nodes = list(self.nodes.values())
+        index = dict((n.hostname, i) for i, n in enumerate(nodes))
+        best = {}
+        for link in self.links.values():
+            if not link.running:
+                continue
+            pair = (index[link.startpoint.hostname], index[link.endpoint.hostname])
+            cost = link_cost(metric, link)
+            if pair not in best or cost < best[pair][0]:
+                best[pair] = (cost, link)
+        edges = [(start, end, cost) for (start, end), (cost, link) in best.items()]
+        # the link from each node to each of its next hops, with None for
+        # no next hop
+        hop_links = [{-1: None} for _ in nodes]
+        for (start, end), (cost, link) in best.items():
+            hop_links[start][end] = link
+        if multipath:
+            # the same, for tuples of next hops
+            choose = [Choice(node, links) for node, links in zip(nodes, hop_links)]
+            routes = paths.equal_cost_hops(len(nodes), edges)
+        else:
+            choose = [links.__getitem__ for links in hop_links]
+            routes = paths.next_hops(len(nodes), edges)
+        for n in nodes:
+            n.forwarding_table.clear()
+        for destinations, hops in routes:
+            # the routes for this chunk of destinations, each with the
+            # position in the chunk of the node it leads to
+            if self.hierarchical:
+                keys = [nodes[destination].prefix[0] for destination in destinations]
+                owners = range(len(destinations))
+            else:
+                keys = []
+                owners = []
+                for i, destination in enumerate(destinations):
+                    keys.extend(nodes[destination].addresses)
+                    owners.extend([i] * len(nodes[destination].addresses))
+            for source, node in enumerate(nodes):
+                row = hops[source]
+                links = list(map(choose[source], map(row.__getitem__, owners)))
+                entries = zip(keys, links)
+                if None in links:
+                    # some destinations, such as the node itself, cannot
+                    # be reached
+                    entries = [(key, link) for key, link in entries if link is not None]
+                if self.hierarchical:
+                    node.forwarding_table.update_prefixes(node.prefix[1], entries)
+                else:
+                    node.forwarding_table.update(entries)
+        # a node has no route to itself
+        for n in nodes:
+            if self.hierarchical:
+                n.forwarding_table.delete_prefix(*n.prefix)
+                n.forwarding_table.aggregate()
+            else:
+                for address in n.addresses:
+                    n.forwarding_table.pop(address, None)
 
     def set_bandwidth(self, link, rate):
         numeric_rate = self.convert(rate)
@@ -88,6 +208,8 @@ class Network(object):
         numeric_size = self.convert(size)
         if size.endswith("pkts"):
             link.queue_size = numeric_size
+        elif size.endswith("bytes"):
+            link.queue_bytes = numeric_size
 
     def set_loss(self, link, loss):
         numeric_loss = self.convert(loss)
@@ -99,8 +221,26 @@ class Network(object):
         return float(re.sub("[^0-9.]", "", value))
 
     def get_link(self, link_number):
-        for n in self.nodes:
-            for l in self.nodes[n].links:
-                if l.address == link_number:
-                    return l
-        return None
+        return self.links.get(link_number)
+
+    def get_link_between(self, start, end):
+        """ Return the first link from the node named start to the node
+            named end, or None. """
+        return self.pairs.get((start, end))
+
+
+class Choice(dict):
+    """ Maps a tuple of next hops from a node, given by index, to what the
+        node routes by to use them all. """
+
+    def __init__(self, node, links):
+        dict.__init__(self)
+        self.node = node
+        self.links = links
+        self[()] = None
+
+    def __missing__(self, hops):
+        route = self[hops] = self.node.next_hop([self.links[h] for h in hops])
+        return route
+
+    __call__ = dict.__getitem__
@@ -0,0 +1,139 @@
+import heapq
+import itertools
+
+try:
+    import numpy
+    from scipy.sparse import csgraph, csr_matrix
+except ImportError:
+    numpy = None
+
+# All-pairs shortest paths for static routing. Nodes are numbered from 0,
+# and a graph is given as a list of (start, end, cost) links, at most one
+# for each pair of nodes. Paths are found from every destination back
+# along the links into it, so that the tree for a destination gives every
+# other node's next hop towards it.
+
+
+def next_hops(count, edges, chunk=256):
+    """ Yield (destinations, hops) for the count nodes, chunk destinations
+        at a time, where hops[n][i] is the node after n on a shortest path
+        from n to destinations[i], or -1 if there is none. With SciPy, the
+        paths to a chunk are found together over a sparse matrix;
+        otherwise Dijkstra's algorithm is run for each destination. """
+    if numpy is None:
+        return dijkstra(count, edges, chunk)
+    return sparse(count, edges, chunk)
+
+
+def equal_cost_hops(count, edges, chunk=256):
+    """ Yield (destinations, hops) as for next_hops, except that
+        hops[n][i] is a tuple of every node after n on some shortest path
+        from n to destinations[i], empty if there is none. """
+    if numpy is None:
+        return dijkstra_multipath(count, edges, chunk)
+    return sparse_multipath(count, edges, chunk)
+
+
+def close(a, b):
+    # path costs that differ only by rounding are equal
+    return a == b or abs(a - b) <= 1e-9 * max(abs(a), abs(b))
+
+
+def shortest(incoming, count, destination):
+    """ Return the distance from every node to the destination, and the
+        node after each on one shortest path to it. """
+    hops = [-1] * count
+    distance = [float('inf')] * count
+    distance[destination] = 0
+    heap = [(0, destination)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if d > distance[node]:
+            continue
+        for start, cost in incoming[node]:
+            if d + cost < distance[start]:
+                distance[start] = d + cost
+                hops[start] = node
+                heapq.heappush(heap, (d + cost, start))
+    return distance, hops
+
+
+def dijkstra(count, edges, chunk):
+    incoming = [[] for _ in range(count)]
+    for start, end, cost in edges:
+        incoming[end].append((start, cost))
+    for first in range(0, count, chunk):
+        destinations = list(range(first, min(first + chunk, count)))
+        rows = [shortest(incoming, count, destination)[1] for destination in destinations]
+        yield destinations, list(zip(*rows))
+
+
+def dijkstra_multipath(count, edges, chunk):
+    incoming = [[] for _ in range(count)]
+    outgoing = [[] for _ in range(count)]
+    for start, end, cost in edges:
+        incoming[end].append((start, cost))
+        outgoing[start].append((end, cost))
+    for first in range(0, count, chunk):
+        destinations = list(range(first, min(first + chunk, count)))
+        rows = [shortest(incoming, count, destination)[0] for destination in destinations]
+        hops = []
+        for source in range(count):
+            # a neighbor that cannot reach the destination is never a next
+            # hop, though close() would take its infinite distance as equal
+            hops.append([tuple(end for end, cost in outgoing[source]
+                               if row[end] < float('inf') and close(row[end] + cost, row[source]))
+                         for row in rows])
+        yield destinations, hops
+
+
+def sparse(count, edges, chunk):
+    starts = numpy.array([e[0] for e in edges], dtype=numpy.int32)
+    ends = numpy.array([e[1] for e in edges], dtype=numpy.int32)
+    costs = numpy.array([e[2] for e in edges], dtype=float)
+    # the graph with every link reversed; explicit zeros are kept as
+    # links of no cost
+    reverse = csr_matrix((costs, (ends, starts)), shape=(count, count))
+    # when every link costs the same, as with the hop count, a breadth
+    # first search finds shortest paths faster than Dijkstra's algorithm
+    uniform = len(edges) == 0 or costs.min() == costs.max()
+    for first in range(0, count, chunk):
+        destinations = numpy.arange(first, min(first + chunk, count))
+        if uniform:
+            predecessors = numpy.array([csgraph.breadth_first_order(reverse, d, return_predecessors=True)[1]
+                                        for d in destinations.tolist()])
+        else:
+            _, predecessors = csgraph.dijkstra(reverse, indices=destinations, return_predecessors=True)
+        predecessors[predecessors < 0] = -1
+        yield destinations.tolist(), predecessors.T.tolist()
+
+
+def sparse_multipath(count, edges, chunk):
+    starts = numpy.array([e[0] for e in edges], dtype=numpy.int32)
+    ends = numpy.array([e[1] for e in edges], dtype=numpy.int32)
+    costs = numpy.array([e[2] for e in edges], dtype=float)
+    reverse = csr_matrix((costs, (ends, starts)), shape=(count, count))
+    uniform = len(edges) == 0 or costs.min() == costs.max()
+    if uniform:
+        # distances are then counted in hops
+        costs = numpy.ones(len(edges))
+    # the links out of each node, as indexes into edges
+    outgoing = [[] for _ in range(count)]
+    for i, (start, end, cost) in enumerate(edges):
+        outgoing[start].append(i)
+    targets = [[edges[i][1] for i in links] for links in outgoing]
+    for first in range(0, count, chunk):
+        destinations = numpy.arange(first, min(first + chunk, count))
+        distance = csgraph.dijkstra(reverse, indices=destinations, unweighted=uniform)
+        # whether each link is on a shortest path to each destination
+        through = distance[:, ends] + costs
+        on = numpy.isfinite(through) & numpy.isclose(through, distance[:, starts], rtol=1e-9, atol=0)
+        on = on.T.tolist()
+        hops = []
+        for source in range(count):
+            rows = [on[i] for i in outgoing[source]]
+            if rows:
+                hops.append([tuple(itertools.compress(targets[source], flags)) for flags in zip(*rows)])
+            else:
+                hops.append([()] * len(destinations))
+        yield destinations.tolist(), hops
@@ -0,0 +1,122 @@
+import csv
+import itertools
+import multiprocessing
+import sys
+
+try:
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+except ImportError:
+    # Python 2 has no concurrent.futures, so runs go to a multiprocessing
+    # pool instead
+    ProcessPoolExecutor = None
+
+sys.path.append('..')
+
+from networks import topology
+from networks.network import Network
+from src.packetqueue import DISCIPLINES
+from src.sim import Simulation
+
+
+def expand(grid):
+    """ Expand a parameter grid, a dictionary mapping each parameter name
+        to a list of values, into a list of dictionaries with one value for
+        every parameter, covering every combination. """
+    names = sorted(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+
+def run_one(config, experiment, params, cache=None):
+    """ Run one point of a sweep in a fresh simulation and return its
+        parameters together with the results of the experiment.
+
+        The network is built from config and the network-wide parameters
+        loss and queue (in packets) are applied to every link before the
+        experiment is called as experiment(sim, network, params). The
+        experiment returns a dictionary of results. The simulation's random
+        streams are seeded from params['seed'] so that each point is
+        reproducible on its own. If cache names a directory, the compiled
+        topology in it is shared by every run."""
+    sim = Simulation(seed=params['seed'])
+    network = Network(config, sim=sim, cache=cache)
+    if params.get('loss') is not None:
+        network.loss(params['loss'])
+    if params.get('queue') is not None:
+        network.queue(params['queue'])
+    result = experiment(sim, network, params)
+    row = dict(params)
+    row.update(result)
+    return row
+
+
+def run_arguments(arguments):
+    return run_one(*arguments)
+
+
+class Sweep(object):
+    """ Runs an experiment over a grid of parameters in parallel.
+
+        Every combination of the values in grid is run in its own
+        simulation on a pool of worker processes. The experiment must be a
+        module-level function so it can be sent to the workers. Results
+        are written to a single CSV file, one row per run, as each run
+        finishes, with a column for every parameter followed by a column
+        for every result. Rows appear in completion order; the run column
+        gives each row's position in the grid.
+
+        The grid may include a seed parameter with a list of seeds, to
+        replicate every point. Otherwise each run is seeded with the base
+        seed plus its run number. Given a cache directory, the network
+        configuration is parsed once and every run loads the compiled
+        topology instead."""
+
+    def __init__(self, config, experiment, grid, output, workers=None, seed=0, cache=None):
+        self.config = config
+        self.cache = cache
+        self.experiment = experiment
+        self.output = output
+        self.workers = workers
+        self.runs = expand(grid)
+        for number, params in enumerate(self.runs):
+            params['run'] = number
+            if 'seed' not in grid:
+                params['seed'] = seed + number
+
+    def run(self):
+        """ Run every point in the grid and return the number of rows
+            written. """
+        if self.cache is not None:
+            # compile the topology before the workers race to do so
+            topology.load(self.config, DISCIPLINES, self.cache)
+        columns = None
+        count = 0
+        with open(self.output, 'w') as f:
+            writer = csv.writer(f)
+            for row in self.results():
+                if columns is None:
+                    parameters = sorted(self.runs[0].keys())
+                    results = sorted(key for key in row if key not in self.runs[0])
+                    columns = parameters + results
+                    writer.writerow(columns)
+                writer.writerow([row.get(column) for column in columns])
+                f.flush()
+                count += 1
+        return count
+
+    def results(self):
+        """ Run every point in the grid on the pool of workers, and yield
+            the row of each run as it finishes. """
+        arguments = [(self.config, self.experiment, params, self.cache) for params in self.runs]
+        if ProcessPoolExecutor is None:
+            pool = multiprocessing.Pool(self.workers)
+            try:
+                for row in pool.imap_unordered(run_arguments, arguments):
+                    yield row
+            finally:
+                pool.terminate()
+                pool.join()
+            return
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(run_one, *args) for args in arguments]
+            for future in as_completed(futures):
+                yield future.result()
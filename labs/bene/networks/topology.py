@@ -0,0 +1,223 @@
+import array
+import hashlib
+import mmap
+import os
+import re
+import struct
+
+try:
+    array_frombytes = array.array.frombytes
+except AttributeError:
+    # Python 2 calls it fromstring
+    array_frombytes = array.array.fromstring
+
+try:
+    replace = os.replace
+except AttributeError:
+    # Python 2 has no os.replace; rename replaces the file atomically on
+    # POSIX systems
+    replace = os.rename
+
+# link settings, in the order of their codes in a compiled topology
+SETTINGS = ('bandwidth', 'propagation', 'queue_size', 'queue_bytes', 'loss', 'discipline')
+
+# value suffixes in the text format, longest first among those sharing an
+# ending, with the setting they configure and the multiplier and divisor
+# that scale their value
+UNITS = (
+    ('Gbps', 'bandwidth', 1000000000, 1),
+    ('Mbps', 'bandwidth', 1000000, 1),
+    ('Kbps', 'bandwidth', 1000, 1),
+    ('bps', 'bandwidth', 1, 1),
+    ('ms', 'propagation', 1, 1000.0),
+    ('seconds', 'propagation', 1, 1),
+    ('pkts', 'queue_size', 1, 1),
+    ('bytes', 'queue_bytes', 1, 1),
+    ('loss', 'loss', 1, 1),
+)
+
+MAGIC = b'BENETOP1'
+HEADER = struct.Struct('=8sIIII')
+
+
+class Topology(object):
+    """ A network configuration reduced to what is needed to build it.
+
+        names lists the nodes in the order they first appear. links holds
+        a (start, end) pair of indexes into names for each link, in
+        address order. settings holds a (link, setting, value) triple for
+        each link setting in the order they appear, where link is an index
+        into links, setting an index into SETTINGS, and value a number, or
+        an index into disciplines for a queue discipline."""
+
+    def __init__(self):
+        self.names = []
+        self.links = []
+        self.settings = []
+        self.disciplines = []
+
+    def add_node(self, name):
+        """ Add a node and return its index. """
+        self.names.append(name)
+        return len(self.names) - 1
+
+    def connect(self, start, end):
+        """ Add a link in each direction between two nodes, given by
+            index, and return the index of the first; the other follows
+            it. """
+        self.links.append((start, end))
+        self.links.append((end, start))
+        return len(self.links) - 2
+
+    def configure(self, links, setting, value):
+        """ Apply a setting, such as 'bandwidth' or 'discipline', to the
+            links with the given indexes. """
+        if setting == 'discipline':
+            if value not in self.disciplines:
+                self.disciplines.append(value)
+            value = self.disciplines.index(value)
+        code = SETTINGS.index(setting)
+        self.settings.extend((link, code, value) for link in links)
+
+
+def number(token, suffix):
+    try:
+        return float(token[:-len(suffix)])
+    except ValueError:
+        # allow anything the original parser did, such as "1,000Kbps"
+        return float(re.sub("[^0-9.]", "", token))
+
+
+def parse(filename, disciplines=()):
+    """ Parse a network configuration file in one pass.
+
+        The file lists each node followed by the nodes it has links to,
+        one node per line, then after a blank line the settings of each
+        link as the two node names followed by values such as 10Mbps,
+        20ms, 100pkts, 30000bytes, 0.1loss, or the name of one of the
+        given queue disciplines. Lines starting with # are ignored. """
+    topology = Topology()
+    index = {}
+    pairs = {}
+
+    def node(name):
+        if name not in index:
+            index[name] = len(topology.names)
+            topology.names.append(name)
+        return index[name]
+
+    configuring = False
+    with open(filename) as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            fields = line.split()
+            if not fields:
+                configuring = True
+                continue
+            if not configuring:
+                if len(fields) < 2:
+                    continue
+                start = node(fields[0])
+                for name in fields[1:]:
+                    end = node(name)
+                    pairs.setdefault((fields[0], name), len(topology.links))
+                    topology.links.append((start, end))
+                continue
+            if len(fields) < 3:
+                continue
+            link = pairs.get((fields[0], fields[1]))
+            for token in fields[2:]:
+                if token in disciplines:
+                    if token not in topology.disciplines:
+                        topology.disciplines.append(token)
+                    setting, value = SETTINGS.index('discipline'), topology.disciplines.index(token)
+                else:
+                    for suffix, name, multiplier, divisor in UNITS:
+                        if token.endswith(suffix):
+                            setting, value = SETTINGS.index(name), number(token, suffix) * multiplier / divisor
+                            break
+                    else:
+                        continue
+                if link is None:
+                    raise ValueError("%s: no link from %s to %s" % (filename, fields[0], fields[1]))
+                topology.settings.append((link, setting, value))
+    return topology
+
+
+def dump(topology, filename):
+    """ Write a topology in the compiled binary format: a header with
+        the counts, the node and discipline names as newline-separated
+        UTF-8, then the link and setting columns as raw arrays in native
+        byte order. """
+    names = '\n'.join(topology.names).encode('utf-8')
+    disciplines = '\n'.join(topology.disciplines).encode('utf-8')
+    links = array.array('i', [i for pair in topology.links for i in pair])
+    settings = topology.settings
+    # write to a temporary file first, so that parallel sweeps never see
+    # a partly written cache entry
+    temporary = '%s.%d' % (filename, os.getpid())
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(names), len(disciplines), len(topology.links), len(settings)))
+        f.write(names)
+        f.write(disciplines)
+        links.tofile(f)
+        array.array('i', [s[0] for s in settings]).tofile(f)
+        array.array('B', [s[1] for s in settings]).tofile(f)
+        array.array('d', [s[2] for s in settings]).tofile(f)
+    replace(temporary, filename)
+
+
+def load_compiled(filename):
+    """ Read a topology written by dump(), mapping the file into memory. """
+    topology = Topology()
+    with open(filename, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, name_bytes, discipline_bytes, link_count, setting_count = HEADER.unpack_from(data, 0)
+            if magic != MAGIC:
+                raise ValueError("%s is not a compiled topology" % filename)
+            offset = HEADER.size
+            names = data[offset:offset + name_bytes].decode('utf-8')
+            offset += name_bytes
+            disciplines = data[offset:offset + discipline_bytes].decode('utf-8')
+            offset += discipline_bytes
+            columns = []
+            for typecode, count in (('i', 2 * link_count), ('i', setting_count),
+                                    ('B', setting_count), ('d', setting_count)):
+                column = array.array(typecode)
+                array_frombytes(column, data[offset:offset + count * column.itemsize])
+                offset += count * column.itemsize
+                columns.append(column)
+        finally:
+            data.close()
+    topology.names = names.split('\n') if names else []
+    topology.disciplines = disciplines.split('\n') if disciplines else []
+    links = columns[0]
+    topology.links = list(zip(links[0::2], links[1::2]))
+    topology.settings = list(zip(columns[1], columns[2], columns[3]))
+    return topology
+
+
+def load(filename, disciplines=(), cache=None):
+    """ Return the topology in a configuration file. If cache is the name
+        of a directory, the topology is compiled into it the first time
+        the file is loaded, keyed by a hash of the file's contents and the
+        known disciplines, and later loads read the compiled copy. """
+    if cache is None:
+        return parse(filename, disciplines)
+    key = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        key.update(f.read())
+    key.update(MAGIC + ' '.join(sorted(disciplines)).encode('utf-8'))
+    compiled = os.path.join(cache, key.hexdigest() + '.topo')
+    if os.path.exists(compiled):
+        return load_compiled(compiled)
+    topology = parse(filename, disciplines)
+    try:
+        os.makedirs(cache)
+    except OSError:
+        if not os.path.isdir(cache):
+            raise
+    dump(topology, compiled)
+    return topology
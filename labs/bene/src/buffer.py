@@ -1,5 +1,19 @@
+import bisect
+import collections
+
+
 class SendBuffer(object):
-    """ Send buffer for transport protocols """
+    """ Send buffer for transport protocols
+
+        Data is kept in the chunks it was put in, with the sequence number
+        each one starts at, so putting data in and sliding the window never
+        copy what is already buffered. When the data that get() or
+        resend() returns lies within one chunk, it is the chunk itself or
+        a memoryview of part of it; only data spanning several chunks is
+        joined into a new string. Sliding drops acked chunks by moving the
+        index of the first one, and the lists are compacted once more than
+        half of them has been dropped, so it takes amortized constant
+        time."""
 
     def __init__(self):
         """ The buffer holds a series of characters to send. The base
@@ -7,7 +21,11 @@ class SendBuffer(object):
             value is the sequence number for the next networks that has
             not yet been sent. The last value is the sequence number
             for the last networks in the buffer."""
-        self.buffer = b''
+        self.chunks = []
+        # the sequence number of the first byte of each chunk
+        self.starts = []
+        # the index of the first chunk not yet acked
+        self.head = 0
         self.base_seq = 0
         self.next_seq = 0
         self.last_seq = 0
@@ -24,9 +42,38 @@ class SendBuffer(object):
 
     def put(self, data):
         """ Put some networks into the buffer """
-        self.buffer += data
+        if not data:
+            return
+        if not isinstance(data, bytes):
+            # keep a copy of anything the caller might change
+            data = bytes(data)
+        self.chunks.append(data)
+        self.starts.append(self.last_seq)
         self.last_seq += len(data)
 
+    def read(self, sequence, size):
+        """ Return size bytes of the buffer from the given sequence
+            number on. """
+        if size <= 0:
+            return b''
+        i = bisect.bisect_right(self.starts, sequence, self.head) - 1
+        offset = sequence - self.starts[i]
+        chunk = self.chunks[i]
+        if offset + size <= len(chunk):
+            if offset == 0 and size == len(chunk):
+                return chunk
+            return memoryview(chunk)[offset:offset + size]
+        # join slices of the chunks themselves, since Python 2 cannot
+        # join memoryviews
+        pieces = []
+        while size > 0:
+            piece = self.chunks[i][offset:offset + size]
+            pieces.append(piece)
+            size -= len(piece)
+            offset = 0
+            i += 1
+        return b''.join(pieces)
+
     def get(self, size):
         """ Get the next networks that has not been sent yet. Return the
             networks and the starting sequence number of this networks. The
@@ -34,8 +81,7 @@ class SendBuffer(object):
             be less."""
         if self.next_seq + size > self.last_seq:
             size = self.last_seq - self.next_seq
-        start = self.next_seq - self.base_seq
-        data = self.buffer[start:start + size]
+        data = self.read(self.next_seq, size)
         sequence = self.next_seq
         self.next_seq = self.next_seq + size
         return data, sequence
@@ -49,7 +95,7 @@ class SendBuffer(object):
         is standard practice for TCP when retransmitting."""
         if self.base_seq + size > self.last_seq:
             size = self.last_seq - self.base_seq
-        data = self.buffer[:size]
+        data = self.read(self.base_seq, size)
         sequence = self.base_seq
         if reset:
             self.next_seq = sequence + size
@@ -61,34 +107,36 @@ class SendBuffer(object):
             sequence number that is not yet acked. In other words, the
             ACK is for all networks less than but not equal to this
             sequence number."""
-        acked = sequence - self.base_seq
-        self.buffer = self.buffer[acked:]
+        # an old ACK does not move the window back, since the chunks it
+        # would uncover have been dropped
+        if sequence <= self.base_seq:
+            return
         self.base_seq = sequence
+        # drop the chunks that have been acked in full
+        chunks, starts = self.chunks, self.starts
+        while self.head < len(chunks) and starts[self.head] + len(chunks[self.head]) <= sequence:
+            chunks[self.head] = None
+            self.head += 1
+        if self.head > 64 and 2 * self.head > len(chunks):
+            del chunks[:self.head]
+            del starts[:self.head]
+            self.head = 0
         # adjust next in case we slide past it
         if self.next_seq < self.base_seq:
             self.next_seq = self.base_seq
 
 
-class Chunk(object):
-    """ Chunk of networks stored in receive buffer. """
-
-    def __init__(self, data, sequence):
-        self.data = data
-        self.length = len(data)
-        self.sequence = sequence
-
-    def trim(self, sequence, length):
-        """ Check for overlap with a previous chunk and trim this chunk
-            if needed."""
-        # check for overlap
-        if self.sequence < sequence + length:
-            self.data = self.data[sequence + length:]
-            self.length = len(self.data)
-            self.sequence = sequence + length
-
-
 class ReceiveBuffer(object):
-    """ Receive buffer for transport protocols """
+    """ Receive buffer for transport protocols
+
+        The data received beyond the base is kept as a list of disjoint
+        intervals of sequence numbers, sorted by start, each holding the
+        pieces of data that cover it in order. A segment is placed with a
+        binary search, only the parts of it that fill gaps are kept, and
+        it is merged with every interval it overlaps or touches. Merging
+        moves the pieces of the smaller interval into the larger one. The
+        intervals are the blocks a TCP receiver reports in selective
+        acknowledgments."""
 
     def __init__(self):
         """ The buffer holds all the networks that has been received,
@@ -96,45 +144,80 @@ class ReceiveBuffer(object):
             of order, so this buffer will order them. Data may also be
             duplicated, so this buffer will remove any duplicate
             bytes."""
-        self.buffer = {}
+        # the start and end of each interval, and its pieces of data
+        self.starts = []
+        self.ends = []
+        self.pieces = []
         # starting sequence number
         self.base_seq = 0
 
     def put(self, data, sequence):
         """ Add networks to the receive buffer. Put it in order of
         sequence number and remove any duplicate networks."""
-        # ignore old chunk
+        end = sequence + len(data)
+        # ignore data that has already been delivered
+        if end <= self.base_seq:
+            return
+        if isinstance(data, memoryview):
+            # on Python 2, bytes() of a memoryview is its repr
+            data = data.tobytes()
+        elif not isinstance(data, bytes):
+            # keep a copy of anything the caller might change
+            data = bytes(data)
         if sequence < self.base_seq:
+            data = data[self.base_seq - sequence:]
+            sequence = self.base_seq
+        if not data:
+            return
+        starts, ends, pieces = self.starts, self.ends, self.pieces
+        # the intervals that overlap or touch the new data
+        first = bisect.bisect_left(ends, sequence)
+        last = bisect.bisect_right(starts, end, first)
+        if first == last:
+            starts.insert(first, sequence)
+            ends.insert(first, end)
+            pieces.insert(first, collections.deque([data]))
             return
-        # ignore duplicate chunk
-        if sequence in self.buffer:
-            if self.buffer[sequence].length >= len(data):
-                return
-        self.buffer[sequence] = Chunk(data, sequence)
-        # remove overlapping networks
-        next_data = -1
-        length = 0
-
-        for sequence in sorted(self.buffer.keys()):
-            chunk = self.buffer[sequence]
-            # trim chunk if there is duplicate networks from the previous chunk
-            chunk.trim(next_data, length)
-            if chunk.length == 0:
-                # remove chunk
-                del self.buffer[sequence]
-            next_data = chunk.sequence
-            length = len(chunk.data)
+        # the pieces are slices of bytes rather than memoryviews, since
+        # Python 2 cannot join memoryviews
+        merged = collections.deque()
+        position = sequence
+        for i in range(first, last):
+            if position < starts[i]:
+                # the new data fills the gap before this interval
+                merged.append(data[position - sequence:starts[i] - sequence])
+            merged = concatenate(merged, pieces[i])
+            position = max(position, ends[i])
+        if position < end:
+            merged.append(data[position - sequence:])
+        starts[first:last] = [min(sequence, starts[first])]
+        ends[first:last] = [max(end, ends[last - 1])]
+        pieces[first:last] = [merged]
 
     def get(self):
         """ Get and remove all networks that is in order. Return the networks
             and its starting sequence number. """
-        data = b''
         start = self.base_seq
-        for sequence in sorted(self.buffer.keys()):
-            chunk = self.buffer[sequence]
-            if chunk.sequence == self.base_seq:
-                # append the networks, adjust the base, delete the chunk
-                data += chunk.data
-                self.base_seq += chunk.length
-                del self.buffer[chunk.sequence]
+        if not self.starts or self.starts[0] != start:
+            return b'', start
+        data = b''.join(self.pieces[0])
+        self.base_seq = self.ends[0]
+        del self.starts[0]
+        del self.ends[0]
+        del self.pieces[0]
         return data, start
+
+    def sack_blocks(self):
+        """ Return the (start, end) sequence numbers of each block of
+            data received out of order, lowest first. """
+        return list(zip(self.starts, self.ends))
+
+
+def concatenate(left, right):
+    """ Return a deque of the pieces of left followed by those of right,
+        reusing the longer of the two. """
+    if len(left) >= len(right):
+        left.extend(right)
+        return left
+    right.extendleft(reversed(left))
+    return right
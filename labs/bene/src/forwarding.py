@@ -0,0 +1,126 @@
+class NextHopGroup(object):
+    """ Equal-cost next hops for a route, which takes the place of a link
+        in a forwarding table. Each packet is sent on one of the links,
+        chosen by hashing its addresses and ports, the tuple a Transport
+        binds connections by, so every packet of a flow takes the same
+        path while different flows spread over the links. The hash is
+        salted, with a different salt at each node, so that the nodes
+        along a path do not all make the same choice. """
+
+    def __init__(self, links, salt=0):
+        self.links = tuple(links)
+        self.salt = salt
+
+    def select(self, packet):
+        flow = (self.salt, packet.source_address, packet.destination_address,
+                packet.source_port, packet.destination_port)
+        return self.links[hash(flow) % len(self.links)]
+
+    def send_packet(self, packet):
+        self.select(packet).send_packet(packet)
+
+
+class ForwardingTable(dict):
+    """ A forwarding table with longest-prefix matching.
+
+        Routes to single addresses are kept as in a dictionary from
+        address to link, or to a NextHopGroup, and the table is one.
+        Routes to prefixes are kept beside them. A prefix is an aligned
+        block of addresses, given by its size, a power of two, and its
+        base, a multiple of the size. The prefixes of each size are kept
+        in a dictionary keyed by base, so looking an address up takes one
+        probe for the address itself and then one for each prefix size in
+        use, smallest first, and the first route found is the longest
+        match.
+
+        aggregate() merges sibling prefixes that use the same link into
+        their parent and drops prefixes that route the same way as the
+        prefix covering them, so a node's table shrinks to a few entries
+        when the addresses behind each of its links are contiguous."""
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.prefixes = {}
+        # the prefix sizes in use, smallest first
+        self.sizes = []
+
+    def clear(self):
+        dict.clear(self)
+        self.prefixes = {}
+        self.sizes = []
+
+    # -- Prefixes --
+
+    def add_prefix(self, base, size, link):
+        if size & (size - 1) or base % size:
+            raise ValueError("%d/%d is not an aligned block of addresses" % (base, size))
+        self.update_prefixes(size, [(base, link)])
+
+    def update_prefixes(self, size, routes):
+        """ Add (base, link) routes to prefixes of the given size. """
+        if size not in self.prefixes:
+            self.prefixes[size] = {}
+            self.sizes = sorted(self.prefixes)
+        self.prefixes[size].update(routes)
+
+    def delete_prefix(self, base, size):
+        level = self.prefixes.get(size)
+        if level is None or base not in level:
+            return
+        del level[base]
+        if not level:
+            del self.prefixes[size]
+            self.sizes = sorted(self.prefixes)
+
+    def prefix_count(self):
+        return sum(len(level) for level in self.prefixes.values())
+
+    def lookup(self, address):
+        """ Return the link of the longest match for an address, or None
+            if there is no route to it. """
+        link = self.get(address)
+        if link is not None:
+            return link
+        for size in self.sizes:
+            link = self.prefixes[size].get(address & -size)
+            if link is not None:
+                return link
+        return None
+
+    def covering(self, base, size):
+        """ Return the link of the longest prefix strictly containing the
+            given one, or None. """
+        for larger in self.sizes:
+            if larger > size:
+                link = self.prefixes[larger].get(base & -larger)
+                if link is not None:
+                    return link
+        return None
+
+    def aggregate(self):
+        """ Replace prefixes with fewer ones that route every address the
+            same way. """
+        size = self.sizes[0] if self.sizes else None
+        while size is not None and size <= self.sizes[-1]:
+            level = self.prefixes.get(size, {})
+            merged = []
+            for base, link in level.items():
+                sibling = base ^ size
+                if base < sibling and level.get(sibling) is link:
+                    merged.append((base, link))
+            if merged:
+                parents = self.prefixes.get(2 * size, {})
+                for base, link in merged:
+                    if parents.get(base, link) is link:
+                        del level[base]
+                        del level[base ^ size]
+                        self.update_prefixes(2 * size, [(base, link)])
+                        parents = self.prefixes[2 * size]
+                if not level:
+                    del self.prefixes[size]
+                    self.sizes = sorted(self.prefixes)
+            size *= 2
+        for size in list(self.sizes):
+            for base, link in list(self.prefixes[size].items()):
+                if self.covering(base, size) is link:
+                    self.delete_prefix(base, size)
@@ -1,27 +1,65 @@
-import random
+import collections
 
-from .sim import Sim
+from .packetqueue import DISCIPLINES, PacketQueue
 
 
 class Link(object):
     def __init__(self, address=0, startpoint=None, endpoint=None, queue_size=None,
-                 bandwidth=1000000.0, propagation=0.001, loss=0):
+                 bandwidth=1000000.0, propagation=0.001, loss=0, sim=None, queue_bytes=None):
+        # a link belongs to the same simulation as the node it starts from
+        self.sim = startpoint.sim if sim is None else sim
         self.running = True
+        self.trace = self.sim.tracer("Link")
         self.address = address
         self.startpoint = startpoint
         self.endpoint = endpoint
-        self.queue_size = queue_size
         self.bandwidth = bandwidth
         self.propagation = propagation
         self.loss = loss
+        # whether to add up the delays of each packet
+        self.measure = self.sim.measure
+        # loss draws come from this link's own stream, created on first
+        # use so that building a large network does not seed one for
+        # every link
+        self._random = None
         self.busy = False
-        self.queue = []
-        if (self.startpoint.hostname == 'n1'):
-            Sim.plot('queue.csv','Time,Queue Size,Event\n')
+        # packets waiting for the link, limited in packets and bytes
+        self.queue = PacketQueue(queue_size, queue_bytes, clock=self.sim.scheduler.current_time)
+        # trace queue sizes and transmissions when this link is selected
+        self.recorder = self.sim.recorder
+        self.entity = self.recorder.entity('%s-%s' % (startpoint.hostname, endpoint.hostname), startpoint.hostname)
+        self.recorder.channel('queue', ('Queue Size',))
+        self.recorder.channel('sequence', ('Sequence Number',))
 
-    @staticmethod
-    def trace(message):
-        Sim.trace("Link", message)
+    @property
+    def random(self):
+        if self._random is None:
+            self._random = self.sim.random.stream('link', self.address)
+        return self._random
+
+    @property
+    def queue_size(self):
+        return self.queue.limit
+
+    @queue_size.setter
+    def queue_size(self, size):
+        self.queue.limit = size
+
+    @property
+    def queue_bytes(self):
+        return self.queue.byte_limit
+
+    @queue_bytes.setter
+    def queue_bytes(self, size):
+        self.queue.byte_limit = size
+
+    def set_discipline(self, name, **params):
+        """ Replace the queue with an empty one using the named queue
+            discipline from DISCIPLINES, keeping its limits. Any other
+            parameters are passed to the discipline. """
+        self.queue = DISCIPLINES[name](self.queue.limit, self.queue.byte_limit,
+                                       clock=self.sim.scheduler.current_time,
+                                       random=self.sim.random.stream('queue', self.address), **params)
 
     # -- Handling packets --
 
@@ -30,53 +68,166 @@ class Link(object):
         if not self.running:
             return
         # drop packet due to queue overflow
-        if self.queue_size and len(self.queue) == self.queue_size:
-            self.trace("%d dropped packet due to queue overflow" % self.address)
-            if (self.startpoint.hostname == 'n1'):
-                Sim.plot('queue.csv','%s,%s,%s\n' % (Sim.scheduler.current_time(),len(self.queue),'drop'))
+        if not self.queue.admits(packet):
+            self.trace("%d dropped packet due to queue overflow", self.address)
+            self.queue.drop(packet)
+            self.recorder.record('queue', self.entity, 'drop', len(self.queue))
             return
         # drop packet due to random loss
-        if self.loss > 0 and random.random() < self.loss:
-            self.trace("%d dropped packet due to random loss" % self.address)
+        if self.loss > 0 and self.random.random() < self.loss:
+            self.trace("%d dropped packet due to random loss", self.address)
             return
-        packet.enter_queue = Sim.scheduler.current_time()
+        packet.enter_queue = self.sim.scheduler.current_time()
         if len(self.queue) == 0 and not self.busy:
             # packet can be sent immediately
             self.busy = True
             self.transmit(packet)
         else:
             # add packet to queue
-            self.queue.append(packet)
-            if (self.startpoint.hostname == 'n1'):
-                Sim.plot('queue.csv','%s,%s,%s\n' % (Sim.scheduler.current_time(),len(self.queue),'size'))
+            self.queue.enqueue(packet)
+            self.recorder.record('queue', self.entity, 'size', len(self.queue))
 
 
     def transmit(self, packet):
-        if (self.startpoint.hostname == 'n1'):
-            try:
-                Sim.plot('sequence.csv','%s,%s,%s\n' % (Sim.scheduler.current_time(),packet.sequence,'transmit'))
-            except:
-                pass
-        packet.queueing_delay += Sim.scheduler.current_time() - packet.enter_queue
+        if hasattr(packet, 'sequence'):
+            self.recorder.record('sequence', self.entity, 'transmit', packet.sequence)
         delay = (8.0 * packet.length) / self.bandwidth
-        packet.transmission_delay += delay
-        packet.propagation_delay += self.propagation
+        if self.measure:
+            packet.queueing_delay += self.sim.scheduler.current_time() - packet.enter_queue
+            packet.transmission_delay += delay
+            packet.propagation_delay += self.propagation
         # schedule packet arrival at end of link
-        Sim.scheduler.add(delay=delay + self.propagation, event=packet, handler=self.endpoint.receive_packet)
+        self.sim.scheduler.add(delay=delay + self.propagation, event=packet, handler=self.endpoint.receive_packet)
         # schedule next transmission
-        Sim.scheduler.add(delay=delay, event='finish', handler=self.get_next_packet)
+        self.sim.scheduler.add(delay=delay, event='finish', handler=self.get_next_packet)
 
     def get_next_packet(self, event):
-        if len(self.queue) > 0:
-            packet = self.queue.pop(0)
-            if (self.startpoint.hostname == 'n1'):
-                Sim.plot('queue.csv','%s,%s,%s\n' % (Sim.scheduler.current_time(),len(self.queue),'size'))
-            self.transmit(packet)
-        else:
+        # the queue discipline may drop packets as they are dequeued
+        packet = self.queue.pop()
+        if packet is None:
             self.busy = False
+            return
+        self.recorder.record('queue', self.entity, 'size', len(self.queue))
+        self.transmit(packet)
 
     def down(self, event):
-        self.running = False
+        if self.running:
+            self.running = False
+            self.startpoint.link_changed(self)
 
     def up(self, event):
-        self.running = True
+        if not self.running:
+            self.running = True
+            self.startpoint.link_changed(self)
+
+
+class AnalyticLink(Link):
+    """ A link that computes when each packet will be sent as it arrives.
+
+        For a drop-tail FIFO link, a packet starts transmission when the
+        packet ahead of it finishes, so its departure and arrival times
+        are known as soon as it is queued. This link schedules only the
+        arrival event for each packet, instead of an arrival and a finish
+        event, and keeps the packets it has committed to in a backlog of
+        [start, finish, packet, arrival event, queued, saved delays]
+        entries. Drops, delays and arrival times are the same as for Link,
+        except that a packet arriving at exactly the time another finishes
+        transmission always sees it finished, and bandwidth changes apply
+        from the next packet queued rather than the next transmitted.
+
+        The link falls back to the event-driven path of Link when its
+        queue is observed: when the queue attribute is read, when the
+        link is selected for recording, or when it uses an active queue
+        discipline. The backlog is then turned back into a queue and a
+        pending finish event, and the link stays event-driven until the
+        queue drains. Taking the link down needs no fallback, since a
+        down link still sends the packets it has queued."""
+
+    def __init__(self, *args, **kwargs):
+        self.backlog = collections.deque()
+        # bytes of every packet in the backlog
+        self.backlog_bytes = 0
+        Link.__init__(self, *args, **kwargs)
+
+    @property
+    def queue(self):
+        self.sync()
+        return self._queue
+
+    @queue.setter
+    def queue(self, queue):
+        self._queue = queue
+
+    def retire(self, entry):
+        # a packet has finished transmission
+        self.backlog_bytes -= entry[6]
+        if entry[4]:
+            self._queue.passed(entry[6], entry[0] - entry[7])
+
+    def sync(self):
+        """ Turn the backlog back into the state of the event-driven path:
+            the packet being transmitted gets a finish event, and the
+            packets waiting behind it go into the queue. """
+        if not self.backlog:
+            return
+        now = self.sim.scheduler.current_time()
+        backlog = self.backlog
+        while backlog and backlog[0][1] <= now:
+            self.retire(backlog.popleft())
+        if not backlog:
+            return
+        head = backlog.popleft()
+        self.retire(head)
+        self.busy = True
+        self.sim.scheduler.add_at(head[1], 'finish', self.get_next_packet)
+        for start, finish, packet, arrival, queued, saved, length, enter_queue in backlog:
+            self.sim.scheduler.cancel(arrival)
+            if self.measure:
+                packet.queueing_delay, packet.transmission_delay, packet.propagation_delay = saved
+            self._queue.enqueue(packet)
+        backlog.clear()
+        self.backlog_bytes = 0
+
+    def send_packet(self, packet):
+        if not self.running:
+            return
+        if self.busy or type(self._queue) is not PacketQueue or self.entity in self.recorder.selected:
+            Link.send_packet(self, packet)
+            return
+        now = self.sim.scheduler.current_time()
+        backlog = self.backlog
+        while backlog and backlog[0][1] <= now:
+            self.retire(backlog.popleft())
+        # drop packet due to queue overflow; the head of the backlog is
+        # being transmitted, and the rest are waiting
+        if backlog:
+            waiting = len(backlog) - 1
+            waiting_bytes = self.backlog_bytes - backlog[0][6]
+        else:
+            waiting = waiting_bytes = 0
+        queue = self._queue
+        if (queue.limit and waiting >= queue.limit) or \
+                (queue.byte_limit and waiting_bytes + packet.length > queue.byte_limit):
+            self.trace("%d dropped packet due to queue overflow", self.address)
+            queue.drop(packet)
+            return
+        # drop packet due to random loss
+        if self.loss > 0 and self.random.random() < self.loss:
+            self.trace("%d dropped packet due to random loss", self.address)
+            return
+        packet.enter_queue = now
+        start = backlog[-1][1] if backlog else now
+        delay = (8.0 * packet.length) / self.bandwidth
+        saved = None
+        if self.measure:
+            saved = (packet.queueing_delay, packet.transmission_delay, packet.propagation_delay)
+            packet.queueing_delay += start - now
+            packet.transmission_delay += delay
+            packet.propagation_delay += self.propagation
+        # schedule packet arrival at end of link
+        arrival = self.sim.scheduler.add_at(start + (delay + self.propagation), packet, self.endpoint.receive_packet)
+        if backlog:
+            queue.max_packets = max(queue.max_packets, waiting + 1)
+            queue.max_bytes = max(queue.max_bytes, waiting_bytes + packet.length)
+        backlog.append([start, start + delay, packet, arrival, bool(backlog), saved, packet.length, now])
+        self.backlog_bytes += packet.length
@@ -0,0 +1,280 @@
+import heapq
+
+from .metrics import hops, link_cost
+from .packet import Packet
+
+INFINITY = float('inf')
+
+
+class LinkState(object):
+    """ Link-state routing for one node.
+
+        Each node describes its running links in a link-state
+        advertisement (LSA): the cost to each neighbor it has a link to,
+        and the addresses it owns, numbered by a sequence that grows with
+        every new advertisement. LSAs are flooded one hop at a time over
+        the broadcast path. A node that hears an LSA newer than the one it
+        has stores it in its database and broadcasts it again, so every
+        LSA crosses each link at most once in each direction.
+
+        Each node keeps a shortest path tree rooted at itself and computed
+        with Dijkstra's algorithm. When an LSA changes, only the tree is
+        repaired, rather than computed again from scratch. Nodes whose path
+        used a link that got worse or went away are detached, and their
+        distances are found again from the rest of the tree. Links that
+        got better are relaxed from their start. Forwarding entries are
+        rewritten only for nodes whose first hop changed.
+
+        The metric gives the cost of a link, which must be positive, as do
+        the functions in metrics. If refresh is given, the node advertises
+        its links again every refresh seconds even when nothing changed.
+
+        With multipath, routes use every first hop on a path of least cost
+        through a NextHopGroup. The tree still gives the distances, but
+        the sets of first hops are found again from them over the whole
+        graph after each change, since they do not follow the tree."""
+
+    def __init__(self, node, metric=hops, refresh=None, multipath=False):
+        self.node = node
+        self.sim = node.sim
+        self.metric = metric
+        self.refresh = refresh
+        self.multipath = multipath
+        self.sequence = 0
+        # the newest LSA of each node, as (sequence, {neighbor: cost},
+        # addresses), and the cost of the links into each node
+        self.database = {}
+        self.incoming = {}
+        # the shortest path tree: each reachable node's distance, parent
+        # and children, and the neighbor its path starts with
+        root = node.hostname
+        self.distance = {root: 0}
+        self.parent = {root: None}
+        self.children = {root: set()}
+        self.first_hop = {}
+        # with multipath, every first hop of each reachable node
+        self.first_hops = {}
+        # the time the forwarding table last changed, and the number of
+        # times the tree has been repaired
+        self.updated = 0
+        self.runs = 0
+        self.node.add_protocol(protocol="link-state", handler=self)
+        self.node.add_link_handler(self.link_changed)
+
+    def start(self, event=None):
+        """ Advertise this node's links. """
+        self.advertise()
+        if self.refresh is not None:
+            self.sim.scheduler.add(delay=self.refresh, event=None, handler=self.start)
+
+    # -- Advertisements --
+
+    def advertise(self):
+        neighbors = {}
+        for link in self.node.links:
+            if link.running:
+                name = link.endpoint.hostname
+                cost = link_cost(self.metric, link)
+                if cost < neighbors.get(name, INFINITY):
+                    neighbors[name] = cost
+        self.sequence += 1
+        body = {
+            "origin": self.node.hostname,
+            "sequence": self.sequence,
+            "neighbors": neighbors,
+            "addresses": tuple(self.node.addresses)
+        }
+        self.install(body)
+        self.flood(body)
+
+    def flood(self, body):
+        # Packet bodies are shared by every copy of a broadcast, and the
+        # database keeps the dictionaries in them, so neither side may
+        # change them
+        p = Packet(destination_address=0, ident=body["sequence"], ttl=1,
+                   protocol="link-state", body=body)
+        self.node.send_packet(p)
+
+    def receive_packet(self, packet):
+        body = packet.body
+        entry = self.database.get(body["origin"])
+        if entry is not None and body["sequence"] <= entry[0]:
+            return
+        self.install(body)
+        self.flood(body)
+
+    def link_changed(self, link):
+        self.advertise()
+
+    # -- Shortest paths --
+
+    def install(self, body):
+        """ Store an LSA and repair the shortest path tree. """
+        origin = body["origin"]
+        neighbors = body["neighbors"]
+        old = self.database.get(origin)
+        old_neighbors = old[1] if old is not None else {}
+        old_addresses = old[2] if old is not None else ()
+        self.database[origin] = (body["sequence"], neighbors, body["addresses"])
+        for name in old_neighbors:
+            if name not in neighbors:
+                del self.incoming[name][origin]
+        for name, cost in neighbors.items():
+            self.incoming.setdefault(name, {})[origin] = cost
+
+        # links from the origin that got worse or went away detach the
+        # subtree below them when they are in the tree
+        detached = set()
+        for name, cost in old_neighbors.items():
+            if neighbors.get(name, INFINITY) > cost and self.parent.get(name) == origin:
+                detached.update(self.subtree(name))
+        # links that got better might shorten paths through the origin
+        better = [name for name, cost in neighbors.items() if cost < old_neighbors.get(name, INFINITY)]
+        changed = self.repair(detached, [(origin, name) for name in better])
+        if self.multipath:
+            changed = self.spread()
+
+        if origin != self.node.hostname:
+            for address in old_addresses:
+                if address not in body["addresses"]:
+                    self.node.delete_forwarding_entry(address)
+            if body["addresses"] != old_addresses:
+                changed.add(origin)
+        self.route(changed)
+
+    def subtree(self, name):
+        nodes = [name]
+        for n in nodes:
+            nodes.extend(self.children[n])
+        return nodes
+
+    def repair(self, detached, edges):
+        """ Find the distances of the detached nodes again, and relax the
+            given (start, end) links, then return the nodes whose first
+            hop may have changed. """
+        self.runs += 1
+        distance = self.distance
+        for name in detached:
+            self.set_parent(name, None)
+            del distance[name]
+        heap = []
+        # a detached node may be reached from any node still in the tree
+        for name in detached:
+            for start, cost in self.incoming.get(name, {}).items():
+                if start in distance:
+                    heap.append((distance[start] + cost, name, start))
+        for start, end in edges:
+            if start in distance:
+                heap.append((distance[start] + self.database[start][1][end], end, start))
+        heapq.heapify(heap)
+
+        moved = set()
+        while heap:
+            d, name, parent = heapq.heappop(heap)
+            if d >= distance.get(name, INFINITY):
+                continue
+            distance[name] = d
+            self.set_parent(name, parent)
+            moved.add(name)
+            if name not in self.database:
+                continue
+            for end, cost in self.database[name][1].items():
+                if d + cost < distance.get(end, INFINITY):
+                    heapq.heappush(heap, (d + cost, end, name))
+
+        # nodes left detached are unreachable
+        changed = set()
+        for name in detached:
+            if name not in distance:
+                del self.parent[name]
+                del self.children[name]
+                self.first_hop.pop(name, None)
+                changed.add(name)
+        # a node's first hop follows its parent's, so it can change below
+        # every node that moved; walking down from the topmost ones visits
+        # parents before their children
+        root = self.node.hostname
+        for name in moved:
+            if self.parent[name] not in moved:
+                for n in self.subtree(name):
+                    parent = self.parent[n]
+                    hop = n if parent == root else self.first_hop[parent]
+                    if self.first_hop.get(n) != hop:
+                        self.first_hop[n] = hop
+                        changed.add(n)
+        return changed
+
+    def spread(self):
+        """ Find every first hop of each reachable node, and return the
+            nodes whose first hops changed. """
+        root = self.node.hostname
+        distance = self.distance
+        hops = dict((name, set()) for name in distance if name != root)
+        # nodes are taken in order of distance, and again whenever they
+        # gain a first hop, since over a link of no cost a node ties with
+        # one at the same distance that may be taken after it
+        heap = [(0, root)]
+        while heap:
+            d, start = heapq.heappop(heap)
+            if start not in self.database:
+                continue
+            for end, cost in self.database[start][1].items():
+                # path costs that differ only by rounding are equal
+                if end not in hops or abs(d + cost - distance[end]) > 1e-9 * distance[end]:
+                    continue
+                new = (set((end,)) if start == root else hops[start]) - hops[end]
+                if new:
+                    hops[end].update(new)
+                    heapq.heappush(heap, (distance[end], end))
+        first_hops = dict((name, tuple(sorted(hops[name]))) for name in hops)
+        changed = set(name for name in first_hops if first_hops[name] != self.first_hops.get(name))
+        changed.update(name for name in self.first_hops if name not in first_hops)
+        self.first_hops = first_hops
+        return changed
+
+    def set_parent(self, name, parent):
+        old = self.parent.get(name)
+        if old is not None and old in self.children:
+            self.children[old].discard(name)
+        self.parent[name] = parent
+        self.children.setdefault(name, set())
+        if parent is not None:
+            self.children[parent].add(name)
+
+    def route(self, names):
+        """ Bring the forwarding entries for the addresses of the given
+            nodes up to date. """
+        changed = False
+        for name in names:
+            if name == self.node.hostname or name not in self.database:
+                continue
+            addresses = self.database[name][2]
+            if self.multipath:
+                hops = self.first_hops.get(name)
+            else:
+                hops = (self.first_hop[name],) if name in self.first_hop else None
+            if not hops:
+                for address in addresses:
+                    self.node.delete_forwarding_entry(address)
+            else:
+                link = self.node.next_hop([self.node.get_link(hop) for hop in hops])
+                for address in addresses:
+                    self.node.add_forwarding_entry(address, link)
+            changed = True
+        if changed:
+            self.updated = self.sim.scheduler.current_time()
+
+    def spf(self):
+        """ Compute the whole shortest path tree again from scratch, and
+            install every route. """
+        root = self.node.hostname
+        self.distance = {root: 0}
+        self.parent = {root: None}
+        self.children = {root: set()}
+        self.first_hop = {}
+        self.first_hops = {}
+        edges = [(root, name) for name in self.database.get(root, (0, {}, ()))[1]]
+        changed = self.repair(set(), edges)
+        if self.multipath:
+            changed = self.spread()
+        self.route(changed | set(self.database))
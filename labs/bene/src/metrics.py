@@ -0,0 +1,37 @@
+# Link metrics for routing. Each gives the cost of a link, a number that
+# must be positive, and routes follow the paths of least total cost. A
+# link of no cost would let two nodes each count the other among their
+# equal-cost next hops, and packets could loop between them.
+
+
+def hops(link):
+    """ Every link costs one, so routes take the fewest hops. """
+    return 1
+
+
+def delay(link):
+    """ A link costs its propagation delay, plus the time to send one bit
+        so that a link with no propagation delay still costs something. """
+    return link.propagation + 1.0 / link.bandwidth
+
+
+def inverse_bandwidth(link):
+    """ A link costs the time to send one bit, so routes prefer fast
+        links, as OSPF does by default. """
+    return 1.0 / link.bandwidth
+
+
+def link_cost(metric, link):
+    """ Return the cost of a link under a metric, raising ValueError if
+        it is not positive. """
+    value = metric(link)
+    if not value > 0:
+        raise ValueError("link %d costs %r, but link costs must be positive" % (link.address, value))
+    return value
+
+
+METRICS = {
+    'hops': hops,
+    'delay': delay,
+    'bandwidth': inverse_bandwidth,
+}
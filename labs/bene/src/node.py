@@ -1,42 +1,75 @@
-import copy
+import zlib
 
+from .forwarding import ForwardingTable, NextHopGroup
 from .sim import Sim
 
 
 class Node(object):
-    def __init__(self, hostname):
+    def __init__(self, hostname, sim=None):
+        self.sim = Sim if sim is None else sim
         self.hostname = hostname
+        self.trace = self.sim.tracer("Node")
         self.links = []
+        # indexes of the links by their address and by the hostname at
+        # their far end, kept up to date by add_link and delete_link
+        self.addresses = {}
+        self.neighbors = {}
+        # functions called with a link of this node when it goes down or
+        # comes back up
+        self.link_handlers = []
         self.protocols = {}
-        self.forwarding_table = {}
+        self.forwarding_table = ForwardingTable()
+        # shared next hop groups, by their links
+        self.groups = {}
+        # the (base, size) block holding the addresses of this node's
+        # links, when the network gives each node one
+        self.prefix = None
         # Added for the routing lab
         self.distance_vectors = {}
-
-    @staticmethod
-    def trace(message):
-        Sim.trace("Node", message)
+        # the neighbor each destination is routed through, and the
+        # destinations whose entries in this node's vector changed since
+        # they were last taken to send as a delta
+        self.next_hops = {}
+        self.changes = set()
+        self.multipath = False
 
     # -- Links --
 
     def add_link(self, link):
         self.links.append(link)
+        self.addresses[link.address] = link
+        # the first link to a neighbor is the one used to reach it
+        self.neighbors.setdefault(link.endpoint.hostname, link)
 
     def delete_link(self, link):
         if link not in self.links:
             return
         self.links.remove(link)
+        if self.addresses.get(link.address) is link:
+            del self.addresses[link.address]
+        name = link.endpoint.hostname
+        if self.neighbors.get(name) is link:
+            del self.neighbors[name]
+            for other in self.links:
+                if other.endpoint.hostname == name:
+                    self.neighbors[name] = other
+                    break
+
+    def add_link_handler(self, handler):
+        self.link_handlers.append(handler)
+
+    def link_changed(self, link):
+        for handler in self.link_handlers:
+            handler(link)
 
     def get_link(self, name):
-        for link in self.links:
-            if link.endpoint.hostname == name:
-                return link
-        return None
+        return self.neighbors.get(name)
 
     def get_address(self, name):
-        for link in self.links:
-            if link.endpoint.hostname == name:
-                return link.address
-        return 0
+        link = self.neighbors.get(name)
+        if link is None:
+            return 0
+        return link.address
 
     # -- Protocols --
 
@@ -58,12 +91,47 @@ class Node(object):
             return
         del self.forwarding_table[address]
 
-    # -- Distance Vectors --
+    def next_hop(self, links):
+        """ Return what to route by to use all of the given links: the
+            link itself if there is only one, or a NextHopGroup shared by
+            every route over the same links. """
+        links = tuple(links)
+        if len(links) == 1:
+            return links[0]
+        if links not in self.groups:
+            salt = zlib.crc32(self.hostname.encode('utf-8'))
+            self.groups[links] = NextHopGroup(links, salt)
+        return self.groups[links]
+
+    def add_forwarding_prefix(self, base, size, link):
+        self.forwarding_table.add_prefix(base, size, link)
 
-    def init_routing(self):
+    def delete_forwarding_prefix(self, base, size):
+        self.forwarding_table.delete_prefix(base, size)
+
+    # -- Distance Vectors --
+    #
+    # Routes are kept incrementally. next_hops holds the neighbors each
+    # destination in this node's vector is reached through, as a sorted
+    # tuple of hostnames, and a change to a neighbor's vector only
+    # revisits the destinations it changed. A destination is compared
+    # across every neighbor again only when its route through one of its
+    # current next hops gets worse or goes away. With multipath, every
+    # neighbor with a route of least distance is a next hop, and the
+    # destination is routed through a NextHopGroup over their links;
+    # otherwise there is one next hop.
+
+    # distances at or beyond this are unreachable, so that a lost route
+    # counts up to infinity in bounded time, as in RIP
+    infinity = 16
+
+    def init_routing(self, multipath=False):
         # Initialize the forwarding table and distance vector for the node
-        self.forwarding_table = {}
+        self.multipath = multipath
+        self.forwarding_table = ForwardingTable()
         self.distance_vectors = {}
+        self.next_hops = {}
+        self.changes = set()
         distance_vector = {}
         for l in self.links:
             if l.running:
@@ -71,7 +139,7 @@ class Node(object):
                 self.add_forwarding_entry(link_address, l)
                 distance_vector[link_address] = 1
         self.distance_vectors[self.hostname] = {
-            "timestamp": Sim.scheduler.current_time(),
+            "timestamp": self.sim.scheduler.current_time(),
             "dv": distance_vector
         }
 
@@ -91,59 +159,144 @@ class Node(object):
         else:
             return None
 
-    def update_distance_vector(self, hostname, vector):
-        changed = self.vector_changed(hostname, vector)
+    def update_distance_vector(self, hostname, vector, sequence=None, delta=False):
+        """ Take a vector from the neighbor named hostname and return
+            whether this node's own vector changed. If delta is true, the
+            vector holds only the entries that changed since the update
+            numbered sequence - 1, with None for ones that were removed.
+            A delta that does not follow on from the last update heard is
+            ignored until the next full vector arrives. """
+        entry = self.distance_vectors.get(hostname)
+        if delta:
+            if entry is None:
+                return False
+            entry["timestamp"] = self.sim.scheduler.current_time()
+            if entry.get("sequence") is None or sequence != entry["sequence"] + 1:
+                entry["sequence"] = None
+                return False
+            entry["sequence"] = sequence
+            stored = entry["dv"]
+            for k, v in vector.items():
+                if v is None:
+                    stored.pop(k, None)
+                else:
+                    stored[k] = v
+            return self.build_forwarding_table(hostname, list(vector))
+        old_vector = entry["dv"] if entry is not None else {}
+        # keep a copy, since deltas change it in place and packet bodies
+        # are shared by every copy of a broadcast
         self.distance_vectors[hostname] = {
-            "timestamp": Sim.scheduler.current_time(),
-            "dv": vector
+            "timestamp": self.sim.scheduler.current_time(),
+            "sequence": sequence,
+            "dv": dict(vector)
         }
+        changed = [k for k, v in vector.items() if old_vector.get(k) != v]
+        changed.extend(k for k in old_vector if k not in vector)
+        return self.build_forwarding_table(hostname, changed)
+
+    def take_distance_vector_changes(self):
+        """ Return the entries of this node's vector that changed since
+            the last call, with None for ones that were removed. """
+        my_vector = self.distance_vectors[self.hostname]["dv"]
+        delta = {k: my_vector.get(k) for k in self.changes}
+        self.changes = set()
+        return delta
+
+    def build_forwarding_table(self, hostname=None, destinations=None):
+        """ Bring the routes to the given destinations up to date after
+            the vector of the neighbor named hostname changed, and return
+            whether this node's own vector changed. With no hostname,
+            every neighbor's vector is taken as changed; with no
+            destinations, every entry of it is. """
+        if hostname is None:
+            changed = False
+            for host in list(self.distance_vectors):
+                if host != self.hostname:
+                    changed = self.build_forwarding_table(host, destinations) or changed
+            return changed
+        if destinations is None:
+            destinations = self.get_distance_vector(hostname) or ()
+        my_vector = self.distance_vectors[self.hostname]["dv"]
+        vector = self.get_distance_vector(hostname) or {}
+        link = self.get_link(hostname)
+        changed = False
+        for k in destinations:
+            if k in self.addresses:
+                continue
+            if k in vector and link is not None:
+                distance = vector[k] + 1
+            else:
+                distance = self.infinity
+            hops = self.next_hops.get(k, ())
+            current = my_vector.get(k, self.infinity)
+            if distance < current:
+                # a better route, through this neighbor
+                self.set_next_hops(k, (hostname,))
+                my_vector[k] = distance
+                self.changes.add(k)
+                changed = True
+            elif hostname in hops and distance != current:
+                # the route through a current next hop got worse
+                changed = self.select_route(k) or changed
+            elif self.multipath and distance == current < self.infinity and hops and hostname not in hops:
+                # a route as good as the current ones, through this neighbor
+                self.set_next_hops(k, tuple(sorted(hops + (hostname,))))
+
         if changed:
-            self.build_forwarding_table()
+            self.distance_vectors[self.hostname]["timestamp"] = self.sim.scheduler.current_time()
+        return changed
+
+    def select_route(self, destination):
+        """ Choose the best route to a destination from the vectors of
+            every neighbor, and return whether it changed. """
+        best, via = self.infinity, ()
+        for host, entry in self.distance_vectors.items():
+            if host == self.hostname or destination not in entry["dv"]:
+                continue
+            distance = entry["dv"][destination] + 1
+            if distance > best or self.get_link(host) is None:
+                continue
+            if distance < best:
+                best, via = distance, (host,)
+            elif self.multipath and best < self.infinity:
+                via += (host,)
+        my_vector = self.distance_vectors[self.hostname]["dv"]
+        old = my_vector.get(destination)
+        if not via:
+            if old is None:
+                return False
+            del my_vector[destination]
+            del self.next_hops[destination]
+            self.delete_forwarding_entry(destination)
+            self.changes.add(destination)
             return True
-        else:
+        my_vector[destination] = best
+        self.set_next_hops(destination, tuple(sorted(via)))
+        if best == old:
             return False
+        self.changes.add(destination)
+        return True
 
-    def build_forwarding_table(self):
-        my_vector = self.distance_vectors[self.hostname]["dv"]
-        for host in self.distance_vectors:
-            if host != self.hostname:
-                vector = self.distance_vectors[host]["dv"]
-                for k, v in vector.iteritems():
-                    found = False
-                    for l in self.links:
-                        if k == l.address:
-                            found = True
-                            break
-                    if found:
-                        continue
-                    if k in my_vector.keys():
-                        if v + 1 < my_vector[k]:
-                            my_vector[k] = v + 1
-                            self.add_forwarding_entry(k, self.get_link(host))
-                    else:
-                        my_vector[k] = v + 1
-                        self.add_forwarding_entry(k, self.get_link(host))
-
-        self.distance_vectors[self.hostname]["timestamp"] = Sim.scheduler.current_time()
+    def set_next_hops(self, destination, hops):
+        """ Route a destination through the given neighbors. """
+        if self.next_hops.get(destination) != hops:
+            self.next_hops[destination] = hops
+            self.add_forwarding_entry(destination, self.next_hop([self.get_link(host) for host in hops]))
 
     def remove_distance_vector(self, hostname):
         if hostname in self.distance_vectors:
-            del self.distance_vectors[hostname]
-            self.init_routing()
-            self.build_forwarding_table()
+            vector = self.distance_vectors.pop(hostname)["dv"]
+            # only the destinations reached through this neighbor change
+            for k in vector:
+                if hostname in self.next_hops.get(k, ()):
+                    self.select_route(k)
+            self.distance_vectors[self.hostname]["timestamp"] = self.sim.scheduler.current_time()
             return True
         return False
 
     def vector_changed(self, hostname, new_vector):
         if hostname in self.distance_vectors:
-            old_vector = self.distance_vectors[hostname]["dv"]
-            if len(old_vector) != len(new_vector):
-                return True
-            else:
-                for k in old_vector:
-                    if k not in new_vector or old_vector[k] != new_vector[k]:
-                        return True
-                return False
+            return self.distance_vectors[hostname]["dv"] != new_vector
         else:
             return True
 
@@ -153,7 +306,7 @@ class Node(object):
         # if this is the first time we have seen this packet, set its
         # creation timestamp
         if packet.created is None:
-            packet.created = Sim.scheduler.current_time()
+            packet.created = self.sim.scheduler.current_time()
 
         # forward the packet
         self.forward_packet(packet)
@@ -161,20 +314,19 @@ class Node(object):
     def receive_packet(self, packet):
         # handle broadcast packets
         if packet.destination_address == 0:
-            self.trace("%s received packet" % self.hostname)
+            self.trace("%s received packet", self.hostname)
             self.deliver_packet(packet)
         else:
             # check if unicast packet is for me
-            for link in self.links:
-                if link.address == packet.destination_address:
-                    self.trace("%s received packet" % self.hostname)
-                    self.deliver_packet(packet)
-                    return
+            if packet.destination_address in self.addresses:
+                self.trace("%s received packet", self.hostname)
+                self.deliver_packet(packet)
+                return
 
         # decrement the TTL and drop if it has reached the last hop
         packet.ttl -= 1
         if packet.ttl <= 0:
-            self.trace("%s dropping packet due to TTL expired" % self.hostname)
+            self.trace("%s dropping packet due to TTL expired", self.hostname)
             return
 
         # forward the packet
@@ -194,15 +346,14 @@ class Node(object):
             self.forward_unicast_packet(packet)
 
     def forward_unicast_packet(self, packet):
-        if packet.destination_address not in self.forwarding_table:
-            self.trace("%s no routing entry for %d" % (self.hostname, packet.destination_address))
+        link = self.forwarding_table.lookup(packet.destination_address)
+        if link is None:
+            self.trace("%s no routing entry for %d", self.hostname, packet.destination_address)
             return
-        link = self.forwarding_table[packet.destination_address]
-        self.trace("%s forwarding packet to %d" % (self.hostname, packet.destination_address))
+        self.trace("%s forwarding packet to %d", self.hostname, packet.destination_address)
         link.send_packet(packet)
 
     def forward_broadcast_packet(self, packet):
         for link in self.links:
-            self.trace("%s forwarding broadcast packet to %s" % (self.hostname, link.endpoint.hostname))
-            packet_copy = copy.deepcopy(packet)
-            link.send_packet(packet_copy)
+            self.trace("%s forwarding broadcast packet to %s", self.hostname, link.endpoint.hostname)
+            link.send_packet(packet.clone())
@@ -1,4 +1,16 @@
 class Packet(object):
+    """ A network packet. Packets are allocated in large numbers, so their
+        fields are stored in slots rather than a per-instance dictionary,
+        and no other attributes can be set on them. Subclasses add their
+        own fields to __slots__ and list every field in fields, which
+        clone() copies."""
+
+    __slots__ = ('source_address', 'source_port', 'destination_address',
+                 'destination_port', 'ident', 'ttl', 'protocol', 'body',
+                 'length', 'created', 'enter_queue', 'queueing_delay',
+                 'transmission_delay', 'propagation_delay')
+    fields = __slots__
+
     def __init__(self, source_address=1, source_port=0,
                  destination_address=1, destination_port=0,
                  ident=0, ttl=100, protocol="None", body=b"", length=0):
@@ -20,3 +32,41 @@ class Packet(object):
         self.queueing_delay = 0
         self.transmission_delay = 0
         self.propagation_delay = 0
+
+    def clone(self):
+        """ Return a copy of this packet to send on another link. Header
+            fields and measurements are copied, but the body is shared
+            rather than copied, so a body must not be changed once its
+            packet has been sent. """
+        packet = self.__class__.__new__(self.__class__)
+        for field in self.fields:
+            setattr(packet, field, getattr(self, field))
+        return packet
+
+
+class PacketPool(object):
+    """ A free list of packets of one class.
+
+        A protocol that knows it holds the only reference to a packet it
+        has received, such as TCP once it has handled a segment, can
+        release it to the pool, and the next packet it sends reuses the
+        released object instead of allocating a new one. At most size
+        packets are kept."""
+
+    def __init__(self, packet_class=Packet, size=1024):
+        self.packet_class = packet_class
+        self.size = size
+        self.free = []
+
+    def get(self, **fields):
+        """ Return a packet initialized with the given fields. """
+        if self.free:
+            packet = self.free.pop()
+            packet.__init__(**fields)
+            return packet
+        return self.packet_class(**fields)
+
+    def release(self, packet):
+        """ Return a packet that is no longer referenced to the pool. """
+        if len(self.free) < self.size:
+            self.free.append(packet)
@@ -0,0 +1,312 @@
+import collections
+import math
+
+
+class PacketQueue(object):
+    """ Drop-tail FIFO queue of packets waiting for a link.
+
+        Packets are held in a deque, so adding and removing them is O(1).
+        The queue may be limited to a number of packets, a number of
+        bytes, or both; a limit of None means no limit. A packet that would
+        take the queue over either limit is refused.
+
+        Occupancy and counts of packets and bytes enqueued, dequeued and
+        dropped are kept as packets come and go, for statistics. Given a
+        clock, a function returning the current time, the queue also
+        keeps the total and maximum queueing delay of dequeued packets,
+        measured from their enter_queue time.
+
+        Subclasses implement active queue management by overriding
+        admits(), which is called once for every arriving packet, and
+        pop(). They draw random numbers from the random stream they are
+        given. A link that has already asked admits() about a packet adds
+        it with enqueue(), which does not ask again."""
+
+    def __init__(self, limit=None, byte_limit=None, clock=None, random=None):
+        self.packets = collections.deque()
+        self.limit = limit
+        self.byte_limit = byte_limit
+        self.clock = clock
+        self.random = random
+        # current occupancy
+        self.bytes = 0
+        # statistics
+        self.enqueued = 0
+        self.enqueued_bytes = 0
+        self.dequeued = 0
+        self.dequeued_bytes = 0
+        self.dropped = 0
+        self.dropped_bytes = 0
+        self.max_packets = 0
+        self.max_bytes = 0
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+
+    def __len__(self):
+        return len(self.packets)
+
+    def admits(self, packet):
+        """ Return True if the packet fits within the queue's limits. """
+        if self.limit and len(self.packets) >= self.limit:
+            return False
+        if self.byte_limit and self.bytes + packet.length > self.byte_limit:
+            return False
+        return True
+
+    def drop(self, packet):
+        """ Count a packet that was refused. """
+        self.dropped += 1
+        self.dropped_bytes += packet.length
+
+    def push(self, packet):
+        """ Add a packet to the tail of the queue. Returns False, and
+            counts the packet as dropped, if it does not fit. """
+        if not self.admits(packet):
+            self.drop(packet)
+            return False
+        self.enqueue(packet)
+        return True
+
+    def enqueue(self, packet):
+        # add a packet that has already been admitted
+        self.packets.append(packet)
+        self.bytes += packet.length
+        self.enqueued += 1
+        self.enqueued_bytes += packet.length
+        if len(self.packets) > self.max_packets:
+            self.max_packets = len(self.packets)
+        if self.bytes > self.max_bytes:
+            self.max_bytes = self.bytes
+
+    def pop(self):
+        """ Remove and return the packet at the head of the queue, or None
+            if the queue is empty. """
+        if not self.packets:
+            return None
+        packet = self.dequeue()
+        self.delivered(packet)
+        return packet
+
+    def dequeue(self):
+        packet = self.packets.popleft()
+        self.bytes -= packet.length
+        return packet
+
+    def delivered(self, packet):
+        # count a packet leaving the queue for the link
+        self.dequeued += 1
+        self.dequeued_bytes += packet.length
+        if self.clock is not None:
+            delay = self.clock() - packet.enter_queue
+            self.total_delay += delay
+            if delay > self.max_delay:
+                self.max_delay = delay
+
+    def passed(self, length, delay):
+        """ Count a packet of the given length that waited for delay
+            without being held in the queue, for links that compute
+            departures themselves. """
+        self.enqueued += 1
+        self.enqueued_bytes += length
+        self.dequeued += 1
+        self.dequeued_bytes += length
+        self.total_delay += delay
+        if delay > self.max_delay:
+            self.max_delay = delay
+
+    def average_delay(self):
+        """ Return the average queueing delay of dequeued packets. """
+        if not self.dequeued:
+            return 0.0
+        return self.total_delay / self.dequeued
+
+    def clear(self):
+        """ Discard every queued packet without counting it as dropped. """
+        self.packets.clear()
+        self.bytes = 0
+
+
+class RED(PacketQueue):
+    """ Random Early Detection (Floyd and Jacobson, 1993).
+
+        An exponentially weighted average of the queue length, in packets,
+        is updated on every arrival. Below min_threshold every packet is
+        admitted; above max_threshold every packet is dropped; in between
+        packets are dropped with a probability that rises linearly to
+        max_p, spread out by the count of packets since the last drop. The
+        hard limits of the queue still apply."""
+
+    def __init__(self, limit=None, byte_limit=None, clock=None, random=None,
+                 min_threshold=5, max_threshold=15, max_p=0.1, weight=0.002):
+        PacketQueue.__init__(self, limit, byte_limit, clock, random)
+        self.min_threshold = min_threshold
+        self.max_threshold = max_threshold
+        self.max_p = max_p
+        self.weight = weight
+        self.average = 0.0
+        self.count = -1
+
+    def admits(self, packet):
+        if not PacketQueue.admits(self, packet):
+            return False
+        self.average += self.weight * (len(self.packets) - self.average)
+        if self.average < self.min_threshold:
+            self.count = -1
+            return True
+        if self.average >= self.max_threshold:
+            self.count = 0
+            return False
+        self.count += 1
+        pb = self.max_p * (self.average - self.min_threshold) / (self.max_threshold - self.min_threshold)
+        if self.count * pb >= 1 or self.random.random() < pb / (1 - self.count * pb):
+            self.count = 0
+            return False
+        return True
+
+
+class CoDel(PacketQueue):
+    """ Controlled Delay (RFC 8289).
+
+        Packets are dropped at the head of the queue when their queueing
+        delay has stayed above target for at least interval. While in
+        the dropping state, drops are spaced by interval divided by the
+        square root of the number of drops so far, until the delay falls
+        below target again. The hard limits of the queue still apply."""
+
+    def __init__(self, limit=None, byte_limit=None, clock=None, random=None,
+                 target=0.005, interval=0.1, mtu=1500):
+        PacketQueue.__init__(self, limit, byte_limit, clock, random)
+        self.target = target
+        self.interval = interval
+        self.mtu = mtu
+        self.first_above_time = 0
+        self.dropping = False
+        self.drop_next = 0
+        self.count = 0
+        self.last_count = 0
+
+    def head(self, now):
+        # dequeue the head packet and decide whether it may be dropped
+        if not self.packets:
+            self.first_above_time = 0
+            return None, False
+        packet = self.dequeue()
+        if now - packet.enter_queue < self.target or self.bytes <= self.mtu:
+            self.first_above_time = 0
+            return packet, False
+        if self.first_above_time == 0:
+            self.first_above_time = now + self.interval
+            return packet, False
+        return packet, now >= self.first_above_time
+
+    def control_law(self, t):
+        return t + self.interval / math.sqrt(self.count)
+
+    def pop(self):
+        now = self.clock()
+        packet, ok_to_drop = self.head(now)
+        if self.dropping:
+            if not ok_to_drop:
+                self.dropping = False
+            while self.dropping and now >= self.drop_next:
+                self.drop(packet)
+                self.count += 1
+                packet, ok_to_drop = self.head(now)
+                if not ok_to_drop:
+                    self.dropping = False
+                else:
+                    self.drop_next = self.control_law(self.drop_next)
+        elif ok_to_drop:
+            self.drop(packet)
+            packet, ok_to_drop = self.head(now)
+            self.dropping = True
+            delta = self.count - self.last_count
+            if delta > 1 and now - self.drop_next < 16 * self.interval:
+                self.count = delta
+            else:
+                self.count = 1
+            self.drop_next = self.control_law(now)
+            self.last_count = self.count
+        if packet is not None:
+            self.delivered(packet)
+        return packet
+
+
+class PIE(PacketQueue):
+    """ Proportional Integral controller Enhanced (RFC 8033).
+
+        Arriving packets are dropped with a probability that is updated
+        every update seconds from the current queueing delay, measured as
+        the delay of the last dequeued packet, and how it has changed
+        since the last update. Updates are made lazily when packets
+        arrive. Bursts of up to max_burst seconds are let through when
+        the queue has been uncongested. The hard limits of the queue still
+        apply."""
+
+    def __init__(self, limit=None, byte_limit=None, clock=None, random=None,
+                 target=0.015, update=0.015, alpha=0.125, beta=1.25,
+                 max_burst=0.15, mean_packet=1000):
+        PacketQueue.__init__(self, limit, byte_limit, clock, random)
+        self.target = target
+        self.update = update
+        self.alpha = alpha
+        self.beta = beta
+        self.max_burst = max_burst
+        self.mean_packet = mean_packet
+        self.probability = 0.0
+        self.delay = 0.0
+        self.old_delay = 0.0
+        self.burst_allowance = max_burst
+        self.next_update = 0.0
+
+    def admits(self, packet):
+        if not PacketQueue.admits(self, packet):
+            return False
+        now = self.clock()
+        while now >= self.next_update:
+            self.update_probability()
+            self.next_update += self.update
+            if self.probability == 0 and self.delay == 0 and self.old_delay == 0:
+                # nothing changes while idle, so skip ahead
+                self.next_update = now + self.update
+        if self.burst_allowance > 0:
+            return True
+        if self.old_delay < self.target / 2 and self.probability < 0.2:
+            return True
+        if self.bytes <= 2 * self.mean_packet:
+            return True
+        return self.random.random() >= self.probability
+
+    def update_probability(self):
+        if not self.packets:
+            self.delay = 0.0
+        p = self.probability
+        delta = self.alpha * (self.delay - self.target) + self.beta * (self.delay - self.old_delay)
+        # scale the adjustment down while the probability is small
+        for bound, scale in ((0.000001, 2048), (0.00001, 512), (0.0001, 128),
+                             (0.001, 32), (0.01, 8), (0.1, 2)):
+            if p < bound:
+                delta /= scale
+                break
+        p += delta
+        if self.delay == 0 and self.old_delay == 0:
+            p *= 0.98
+        self.probability = min(max(p, 0.0), 1.0)
+        if self.burst_allowance > 0:
+            self.burst_allowance = max(self.burst_allowance - self.update, 0)
+        if self.probability == 0 and self.delay < self.target / 2 and self.old_delay < self.target / 2:
+            self.burst_allowance = self.max_burst
+        self.old_delay = self.delay
+
+    def delivered(self, packet):
+        PacketQueue.delivered(self, packet)
+        self.delay = self.clock() - packet.enter_queue
+
+
+# queue disciplines by the name used in network configuration files
+DISCIPLINES = {
+    'droptail': PacketQueue,
+    'red': RED,
+    'codel': CoDel,
+    'pie': PIE,
+}
@@ -0,0 +1,221 @@
+import array
+import json
+import os
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    array_frombytes = array.array.frombytes
+except AttributeError:
+    # Python 2 calls it fromstring
+    array_frombytes = array.array.fromstring
+
+
+class Channel(object):
+    """ One kind of trace record, such as queue sizes or sequence numbers.
+
+        Records are stored column by column in preallocated arrays: the
+        time, the id of the entity that recorded it, an event code, and one
+        float for each value column. Event names are turned into codes the
+        first time they are seen. When the arrays fill up they are flushed
+        to the channel's file and reused, so recording a packet only stores
+        numbers and never formats a string."""
+
+    def __init__(self, recorder, name, columns, chunk):
+        self.recorder = recorder
+        self.name = name
+        self.columns = tuple(columns)
+        self.chunk = chunk
+        self.time = array.array('d', [0.0]) * chunk
+        self.entity = array.array('i', [0]) * chunk
+        self.event = array.array('H', [0]) * chunk
+        self.values = [array.array('d', [0.0]) * chunk for _ in self.columns]
+        self.length = 0
+        self.events = []
+        self.codes = {}
+        self.file = None
+
+    def record(self, time, entity, event, values):
+        n = self.length
+        self.time[n] = time
+        self.entity[n] = entity
+        try:
+            self.event[n] = self.codes[event]
+        except KeyError:
+            self.codes[event] = len(self.events)
+            self.events.append(event)
+            self.event[n] = self.codes[event]
+        for column, value in zip(self.values, values):
+            column[n] = value
+        self.length = n + 1
+        if self.length == self.chunk:
+            self.flush()
+
+    def filename(self, extension):
+        return os.path.join(self.recorder.directory, self.name + extension)
+
+    def flush(self):
+        """ Write the buffered records to the channel's file. """
+        if self.length == 0:
+            return
+        if self.recorder.format == 'csv':
+            self.flush_csv()
+        else:
+            self.flush_binary()
+        self.length = 0
+
+    def flush_csv(self):
+        if self.file is None:
+            self.file = open(self.filename('.csv'), 'w')
+            self.file.write(','.join(('Time', 'Entity') + self.columns + ('Event',)) + '\n')
+        names = self.recorder.names
+        lines = []
+        for n in range(self.length):
+            fields = [repr(self.time[n]), names[self.entity[n]]]
+            fields.extend(number(column[n]) for column in self.values)
+            fields.append(self.events[self.event[n]])
+            lines.append(','.join(fields))
+        self.file.write('\n'.join(lines) + '\n')
+
+    def flush_binary(self):
+        # each chunk is its record count and number of value columns,
+        # followed by every column in turn
+        if self.file is None:
+            self.file = open(self.filename('.bin'), 'wb')
+        self.file.write(struct.pack('=II', self.length, len(self.values)))
+        for column in [self.time, self.entity, self.event] + self.values:
+            column[:self.length].tofile(self.file)
+
+    def close(self):
+        self.flush()
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        if self.recorder.format == 'csv':
+            return
+        meta = {'columns': list(self.columns), 'events': self.events,
+                'entities': self.recorder.names}
+        with open(self.filename('.json'), 'w') as f:
+            json.dump(meta, f)
+        if self.recorder.format == 'npy':
+            columns = load(self.filename('.bin'))
+            numpy.savez(self.filename('.npz'), **dict((k, numpy.array(v)) for k, v in columns.items()))
+            os.remove(self.filename('.bin'))
+
+
+class Recorder(object):
+    """ Typed, buffered trace recorder for one simulation.
+
+        Links and connections register as entities with a name and the
+        hostname of their node, and record into named channels. Only
+        selected entities are recorded; select() takes entity or node
+        names, so select('n1') records every link and connection on n1,
+        as the old plot files did. Nothing is recorded until something is
+        selected.
+
+        Each channel is written to a file named after it in directory, in
+        one of three formats:
+
+          csv     one row per record, with a header, as the plotting
+                  scripts expect
+          binary  chunks of raw columns in native byte order, readable with
+                  load(), plus a JSON file naming the events and entities
+          npy     the binary format converted to a NumPy .npz archive of
+                  columns when the recorder is closed
+
+        Records are flushed every chunk records and when the simulation
+        is closed."""
+
+    def __init__(self, scheduler, directory='.', format='csv', chunk=65536):
+        if format not in ('csv', 'binary', 'npy'):
+            raise ValueError("unknown trace format %r" % format)
+        if format == 'npy' and numpy is None:
+            raise ImportError("the npy trace format requires NumPy")
+        self.scheduler = scheduler
+        self.directory = directory
+        self.format = format
+        self.chunk = chunk
+        self.channels = {}
+        self.names = []
+        self.nodes = []
+        self.selection = set()
+        self.selected = set()
+
+    def entity(self, name, node=None):
+        """ Register an entity and return its id. """
+        ident = len(self.names)
+        self.names.append(name)
+        self.nodes.append(node)
+        if name in self.selection or node in self.selection:
+            self.selected.add(ident)
+        return ident
+
+    def select(self, *names):
+        """ Record the entities with the given names, or on the nodes with
+            the given hostnames, including ones registered later. """
+        self.selection.update(names)
+        for ident in range(len(self.names)):
+            if self.names[ident] in self.selection or self.nodes[ident] in self.selection:
+                self.selected.add(ident)
+
+    def channel(self, name, columns):
+        """ Return the channel with the given name, creating it with the
+            given value columns on first use. """
+        if name not in self.channels:
+            self.channels[name] = Channel(self, name, columns, self.chunk)
+        return self.channels[name]
+
+    def record(self, channel, entity, event, *values):
+        """ Record an event with the given values for an entity, at the
+            current time, if the entity is selected. """
+        if entity not in self.selected:
+            return
+        self.channels[channel].record(self.scheduler.current_time(), entity, event, values)
+
+    def flush(self):
+        for channel in self.channels.values():
+            channel.flush()
+
+    def close(self):
+        for channel in self.channels.values():
+            channel.close()
+
+
+def number(value):
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def load(filename):
+    """ Read a binary channel file into a dictionary of columns. Value
+        columns are named value0, value1 and so on, in the order given by
+        the columns list in the channel's JSON file. """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    columns = None
+    offset = 0
+    while offset < len(data):
+        count, width = struct.unpack_from('=II', data, offset)
+        offset += 8
+        chunk = []
+        for typecode in ('d', 'i', 'H') + ('d',) * width:
+            column = array.array(typecode)
+            size = count * column.itemsize
+            array_frombytes(column, data[offset:offset + size])
+            offset += size
+            chunk.append(column)
+        if columns is None:
+            columns = chunk
+        else:
+            for column, more in zip(columns, chunk):
+                column.extend(more)
+    if columns is None:
+        return {}
+    names = ['time', 'entity', 'event'] + ['value%d' % i for i in range(len(columns) - 3)]
+    return dict(zip(names, columns))
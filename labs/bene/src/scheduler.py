@@ -1,15 +1,61 @@
+import bisect
+import heapq
 import itertools
-import sched
+
+
+class Halt(Exception):
+    """ Raised by a stop marker in the queue to end Scheduler.run. """
+    pass
 
 
 class Scheduler(object):
+    """ Discrete event scheduler built on a binary heap.
+
+        Each pending event is stored as a list [time, sequence, handler,
+        event]. The sequence number breaks ties so that events scheduled
+        for the same time run in the order they were added. Cancelling an
+        event does not search the heap; it marks the entry as a tombstone
+        by clearing its handler, and the entry is discarded when it
+        reaches the top of the heap.
+
+        A run can be bounded by a time horizon or an event count, or
+        stopped from inside a handler. Horizons and stop requests are
+        implemented as marker entries with negative sequence numbers, which
+        sort ahead of every real event at the same time and raise Halt when
+        they are dispatched, so the dispatch loop itself does no extra
+        checking per event. Each marker gets its own sequence number, so
+        two markers at the same time never compare their handlers."""
+
     def __init__(self):
         self.current = 0
         self.count = itertools.count()
-        self.scheduler = sched.scheduler(self.current_time, self.advance_time)
+        self.markers = itertools.count(-1, -1)
+        self.queue = []
+        # number of tombstones still sitting in the queue
+        self.cancelled = 0
+        self.running = False
+        self.stopping = None
+        # functions called after the scheduler is reset
+        self.reset_handlers = []
+
+    def add_reset_handler(self, handler):
+        self.reset_handlers.append(handler)
 
     def reset(self):
+        """ Reset the clock to zero and discard any pending events. """
         self.current = 0
+        for entry in self.entries():
+            entry[2] = None
+        self.clear()
+        for handler in self.reset_handlers:
+            handler()
+
+    def clear(self):
+        del self.queue[:]
+        self.cancelled = 0
+
+    def entries(self):
+        return self.queue
 
     def current_time(self):
         return self.current
@@ -17,11 +63,301 @@ class Scheduler(object):
     def advance_time(self, units):
         self.current += units
 
+    def pending(self):
+        """ Return the number of events that are waiting to run. """
+        return len(self.queue) - self.cancelled
+
+    def peek(self):
+        """ Return the time of the next pending event, or None if there
+            are no events left. """
+        while self.queue and self.queue[0][2] is None:
+            heapq.heappop(self.queue)
+            self.cancelled -= 1
+        if not self.queue:
+            return None
+        return self.queue[0][0]
+
+    def add(self, delay, event, handler):
+        entry = [self.current + delay, next(self.count), handler, event]
+        heapq.heappush(self.queue, entry)
+        return entry
+
+    def add_at(self, time, event, handler):
+        """ Schedule an event at an absolute time rather than after a
+            delay. """
+        entry = [time, next(self.count), handler, event]
+        self.push(entry)
+        return entry
+
+    def push(self, entry):
+        heapq.heappush(self.queue, entry)
+
+    def discard(self, entry):
+        """ Take an entry that has not run out of the queue, rather than
+            leaving a tombstone behind. """
+        queue = self.queue
+        for i, e in enumerate(queue):
+            if e is entry:
+                break
+        else:
+            return
+        last = queue.pop()
+        if last is not entry:
+            queue[i] = last
+            heapq.heapify(queue)
+
+    def cancel(self, event):
+        if event[2] is None:
+            return
+        event[2] = None
+        event[3] = None
+        self.cancelled += 1
+        # rebuild the heap once it is mostly tombstones, so that a long
+        # run of cancelled timers does not keep the queue from shrinking
+        if self.cancelled > 64 and self.cancelled * 2 > len(self.queue):
+            self.queue[:] = [entry for entry in self.queue if entry[2] is not None]
+            heapq.heapify(self.queue)
+            self.cancelled = 0
+
+    # -- Running --
+
+    def run(self, until=None, max_events=None):
+        """ Run events in time order until there are none left. If until
+            is given, stop when the clock reaches that time; events
+            scheduled for exactly that time are left in the queue and the
+            clock is left at the horizon. If max_events is given, stop after
+            that many events have run. A stopped run can be continued by
+            calling run again. """
+        # a horizon already passed would move the clock back
+        if until is not None and until <= self.current:
+            return
+        horizon = None
+        if until is not None:
+            horizon = [until, next(self.markers), self.halt, None]
+            self.push(horizon)
+        self.running = True
+        try:
+            self.dispatch(max_events)
+        except Halt:
+            pass
+        finally:
+            self.running = False
+            # a marker that did not end the run is still in the queue
+            for marker in (horizon, self.stopping):
+                if marker is not None and marker[2] is not None:
+                    self.discard(marker)
+            self.stopping = None
+
+    def step(self):
+        """ Run the next event. Return False if there are no events left. """
+        if self.peek() is None:
+            return False
+        self.run(max_events=1)
+        return True
+
+    def stop(self):
+        """ Stop the current run once the running handler returns. Calling
+            this outside of a run does nothing. """
+        if self.running and self.stopping is None:
+            self.stopping = [self.current, next(self.markers), self.halt, None]
+            self.push(self.stopping)
+
+    def halt(self, event):
+        raise Halt()
+
+    def dispatch(self, limit=None):
+        """ Run events until the queue is empty or, if limit is given, until
+            limit events have run. """
+        queue = self.queue
+        pop = heapq.heappop
+        if limit is None:
+            while queue:
+                entry = pop(queue)
+                handler = entry[2]
+                if handler is None:
+                    self.cancelled -= 1
+                    continue
+                # clear the handler so a late cancel of this event is a no-op
+                entry[2] = None
+                self.current = entry[0]
+                handler(entry[3])
+            return
+        for _ in itertools.repeat(None, limit):
+            while queue:
+                entry = pop(queue)
+                handler = entry[2]
+                if handler is not None:
+                    break
+                self.cancelled -= 1
+            else:
+                return
+            entry[2] = None
+            self.current = entry[0]
+            handler(entry[3])
+
+
+class CalendarScheduler(Scheduler):
+    """ Discrete event scheduler built on a calendar queue.
+
+        A calendar queue hashes events into an array of buckets, each
+        covering an interval of time, and visits the buckets in order like
+        the days of a year. With a bucket width close to the average
+        spacing between events, adding and removing an event takes
+        constant expected time, which pays off once there are many
+        thousands of pending events. The number of buckets and their width
+        are recalculated as the population grows and shrinks."""
+
+    def __init__(self, buckets=2, width=1.0):
+        Scheduler.__init__(self)
+        self.size = 0
+        self.resize_enabled = True
+        self.local_init(buckets, width, 0)
+
+    def local_init(self, buckets, width, start):
+        """ Create an empty calendar with the given number of buckets, each
+            covering width units of time, positioned so the next event
+            dequeued is the first one at or after start."""
+        self.buckets = [[] for _ in range(buckets)]
+        self.width = float(width)
+        self.last_bucket = int(start / self.width) % buckets
+        self.bucket_top = (int(start / self.width) + 1) * self.width + 0.5 * self.width
+        self.last_time = start
+        self.grow = 2 * buckets
+        self.shrink = buckets // 2 - 2
+
+    def clear(self):
+        self.local_init(len(self.buckets), self.width, 0)
+        self.size = 0
+        self.cancelled = 0
+
+    def entries(self):
+        return [entry for bucket in self.buckets for entry in bucket]
+
+    def pending(self):
+        """ Return the number of events that are waiting to run. """
+        return self.size - self.cancelled
+
+    def peek(self):
+        """ Return the time of the next pending event, or None if there
+            are no events left. """
+        live = [entry for bucket in self.buckets for entry in bucket if entry[2] is not None]
+        if not live:
+            return None
+        return min(live)[0]
+
     def add(self, delay, event, handler):
-        return self.scheduler.enter(delay, next(self.count), handler, [event])
+        entry = [self.current + delay, next(self.count), handler, event]
+        self.insert(entry)
+        return entry
+
+    def push(self, entry):
+        self.insert(entry)
+
+    def insert(self, entry):
+        bucket = int(entry[0] / self.width) % len(self.buckets)
+        bisect.insort(self.buckets[bucket], entry)
+        self.size += 1
+        if self.size > self.grow:
+            self.resize(2 * len(self.buckets))
+
+    def discard(self, entry):
+        """ Take an entry that has not run out of the calendar, rather
+            than leaving a tombstone behind. """
+        bucket = self.buckets[int(entry[0] / self.width) % len(self.buckets)]
+        for i, e in enumerate(bucket):
+            if e is entry:
+                del bucket[i]
+                self.size -= 1
+                return
 
     def cancel(self, event):
-        self.scheduler.cancel(event)
+        if event[2] is None:
+            return
+        event[2] = None
+        event[3] = None
+        self.cancelled += 1
+
+    def remove(self):
+        """ Remove and return the earliest entry in the calendar. """
+        buckets = self.buckets
+        count = len(buckets)
+        i = self.last_bucket
+        while True:
+            # look for an event in this bucket's day of the current year
+            bucket = buckets[i]
+            if bucket and bucket[0][0] < self.bucket_top:
+                entry = bucket.pop(0)
+                self.last_bucket = i
+                self.last_time = entry[0]
+                self.size -= 1
+                if self.size < self.shrink:
+                    self.resize(len(buckets) // 2)
+                return entry
+            i += 1
+            self.bucket_top += self.width
+            if i == count:
+                i = 0
+            if i == self.last_bucket:
+                break
+        # a whole year went by without an event, so do a direct search for
+        # the bucket holding the earliest event
+        i = min((b for b in range(count) if buckets[b]), key=lambda b: buckets[b][0])
+        time = buckets[i][0][0]
+        self.last_bucket = i
+        self.bucket_top = (int(time / self.width) + 1) * self.width + 0.5 * self.width
+        return self.remove()
+
+    def resize(self, buckets):
+        """ Copy every entry into a calendar with a new number of buckets,
+            using a bucket width estimated from the current events. """
+        if not self.resize_enabled or buckets < 2:
+            return
+        width = self.new_width()
+        entries = [entry for bucket in self.buckets for entry in bucket if entry[2] is not None]
+        self.local_init(buckets, width, self.last_time)
+        self.size = 0
+        self.cancelled = 0
+        self.resize_enabled = False
+        for entry in entries:
+            self.insert(entry)
+        self.resize_enabled = True
+
+    def new_width(self):
+        """ Estimate a bucket width as three times the average separation
+            between the events at the head of the queue. """
+        head = heapq.nsmallest(min(self.size, 25), (entry[0] for bucket in self.buckets for entry in bucket))
+        if len(head) < 2:
+            return self.width
+        separations = [b - a for a, b in zip(head, head[1:])]
+        average = sum(separations) / len(separations)
+        close = [s for s in separations if s < 2 * average]
+        if not close or sum(close) == 0:
+            return self.width
+        return 3.0 * sum(close) / len(close)
 
-    def run(self):
-        self.scheduler.run()
+    def dispatch(self, limit=None):
+        """ Run events until the queue is empty or, if limit is given, until
+            limit events have run. """
+        if limit is None:
+            while self.size:
+                entry = self.remove()
+                handler = entry[2]
+                if handler is None:
+                    self.cancelled -= 1
+                    continue
+                entry[2] = None
+                self.current = entry[0]
+                handler(entry[3])
+            return
+        for _ in itertools.repeat(None, limit):
+            while self.size:
+                entry = self.remove()
+                handler = entry[2]
+                if handler is not None:
+                    break
+                self.cancelled -= 1
+            else:
+                return
+            entry[2] = None
+            self.current = entry[0]
+            handler(entry[3])
@@ -1,26 +1,77 @@
 from __future__ import print_function
 
+import functools
+
+from . import packet
+from . import recorder
 from . import scheduler
+from . import streams
+from . import timer
+
+
+class Simulation(object):
+    """ The state of one simulation: the scheduler that drives it, the
+        timer wheel for protocol timers, its random streams, its trace
+        recorder, and its debugging settings. Networks, nodes, links and
+        transports are given the simulation they belong to, so several
+        simulations can be built and run independently in the same process.
+
+        The seed and batch arguments configure the random streams; see
+        RandomStreams. A simulation with a seed is reproducible no matter
+        what else runs in the same process. Trace files are written to
+        trace_directory in trace_format; see Recorder.
+
+        If measure is False, links do not add up the queueing,
+        transmission and propagation delays of each packet."""
+
+    def __init__(self, scheduler_class=scheduler.Scheduler, seed=None, batch=0,
+                 trace_directory='.', trace_format='csv', measure=True):
+        self.scheduler = scheduler_class()
+        self.timers = timer.TimerWheel(self.scheduler)
+        self.random = streams.RandomStreams(seed, batch)
+        self.recorder = recorder.Recorder(self.scheduler, trace_directory, trace_format)
+        self.measure = measure
+        self.pools = {}
+        self.debug = {}
+
+    def reset(self):
+        """ Reset the clock and discard all pending events and timers. """
+        self.scheduler.reset()
+
+    def close(self):
+        """ Flush and close the trace files of this simulation. """
+        self.recorder.close()
+
+    def pool(self, packet_class):
+        """ Return the simulation's free list of packets of the given
+            class. """
+        if packet_class not in self.pools:
+            self.pools[packet_class] = packet.PacketPool(packet_class)
+        return self.pools[packet_class]
+
+    def set_debug(self, kind):
+        self.debug[kind] = True
+
+    def trace(self, kind, message, *args):
+        """ Print a debugging message if kind is enabled. The message is
+            formatted with args only when it is printed. """
+        if kind in self.debug:
+            print(self.scheduler.current_time(), message % args if args else message)
 
+    def tracer(self, kind):
+        """ Return a function that traces messages of the given kind, with
+            the same arguments as trace() less the kind. If the kind is not
+            enabled, the function does nothing. Components bind a tracer
+            when they are built, so debug kinds must be set before the
+            network is built. """
+        if kind not in self.debug:
+            return ignore
+        return functools.partial(self.trace, kind)
 
-class Sim(object):
-    scheduler = scheduler.Scheduler()
-    debug = {}
-    files = {}
 
-    @staticmethod
-    def set_debug(kind):
-        Sim.debug[kind] = True
+def ignore(message, *args):
+    pass
 
-    @staticmethod
-    def trace(kind, message):
-        if kind in Sim.debug:
-            print(Sim.scheduler.current_time(), message)
 
-    @staticmethod
-    def plot(filename, message):
-        if 'Plot' not in Sim.debug:
-            return
-        if filename not in Sim.files:
-            Sim.files[filename] = open(filename,'wb')
-        Sim.files[filename].write(message)
+# The default simulation, used by anything that is not given one
+Sim = Simulation()
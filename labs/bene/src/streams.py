@@ -0,0 +1,77 @@
+import hashlib
+import random
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class BatchedStream(object):
+    """ A random stream that draws uniforms and exponentials from NumPy in
+        blocks, so each draw is a list pop instead of a call into the
+        generator. It supports the random() and expovariate() methods of
+        random.Random, which is what the simulator uses."""
+
+    def __init__(self, seed, size=4096):
+        self.generator = numpy.random.RandomState(seed % (1 << 32))
+        self.size = size
+        self.uniforms = []
+        self.exponentials = []
+
+    def random(self):
+        try:
+            return self.uniforms.pop()
+        except IndexError:
+            self.uniforms = self.generator.random_sample(self.size).tolist()
+            return self.uniforms.pop()
+
+    def expovariate(self, lambd):
+        try:
+            return self.exponentials.pop() / lambd
+        except IndexError:
+            self.exponentials = self.generator.standard_exponential(self.size).tolist()
+            return self.exponentials.pop() / lambd
+
+
+class RandomStreams(object):
+    """ Registry of independent random streams for one simulation.
+
+        Each component asks for a stream by name, such as ('link', 3) or
+        ('generator', 'n1'), and gets its own generator seeded from the
+        simulation seed and that name. A component's draws therefore do
+        not depend on the order in which events interleave or on what any
+        other component draws, and a run is reproduced exactly by its
+        seed. With no seed, streams are seeded from the operating system.
+
+        If batch is non-zero and NumPy is available, streams are
+        BatchedStreams that pre-generate blocks of batch values;
+        otherwise they are instances of random.Random."""
+
+    def __init__(self, seed=None, batch=0):
+        self.seed = seed
+        self.batch = batch if numpy is not None else 0
+        self.streams = {}
+
+    def stream(self, *name):
+        """ Return the stream with the given name, creating it on first
+            use. """
+        if name not in self.streams:
+            self.streams[name] = self.create(name)
+        return self.streams[name]
+
+    def create(self, name):
+        if self.seed is None:
+            seed = random.SystemRandom().getrandbits(64)
+        else:
+            seed = self.substream_seed(name)
+        if self.batch:
+            return BatchedStream(seed, self.batch)
+        return random.Random(seed)
+
+    def substream_seed(self, name):
+        """ Derive a 64-bit seed for a named stream from the simulation
+            seed. A hash is used rather than seed arithmetic so that
+            streams for neighbouring names are unrelated. """
+        key = repr((self.seed,) + tuple(name)).encode('utf-8')
+        return int(hashlib.sha256(key).hexdigest()[:16], 16)
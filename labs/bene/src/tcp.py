@@ -1,6 +1,5 @@
 from .buffer import SendBuffer, ReceiveBuffer
 from .connection import Connection
-from .sim import Sim
 from .tcppacket import TCPPacket
 
 
@@ -11,6 +10,10 @@ class TCP(Connection):
                  destination_address, destination_port, app=None, window=1000,drop=[]):
         Connection.__init__(self, transport, source_address, source_port,
                             destination_address, destination_port, app)
+        # debugging messages
+        self.trace = self.sim.tracer("TCP")
+        # free list of packets, shared by the connections in the simulation
+        self.pool = self.sim.pool(TCPPacket)
 
         # -- Sender functionality
 
@@ -42,17 +45,12 @@ class TCP(Connection):
         # number not yet received
         self.ack = 0
 
-    def trace(self, message):
-        """ Print debugging messages. """
-        Sim.trace("TCP", message)
-
     def plot_sequence_header(self):
-        if self.node.hostname =='n1':
-            Sim.plot('sequence.csv','Time,Sequence Number,Event\n')
+        self.entity = self.sim.recorder.entity('%s:%d' % (self.node.hostname, self.source_port), self.node.hostname)
+        self.sim.recorder.channel('sequence', ('Sequence Number',))
 
     def plot_sequence(self,sequence,event):
-        if self.node.hostname =='n1':
-            Sim.plot('sequence.csv','%s,%s,%s\n' % (Sim.scheduler.current_time(),sequence,event))
+        self.sim.recorder.record('sequence', self.entity, event, sequence)
 
     def receive_packet(self, packet):
         """ Receive a packet from the network layer. """
@@ -62,6 +60,8 @@ class TCP(Connection):
         if packet.length > 0:
             # handle data
             self.handle_data(packet)
+        # nothing holds on to a segment once it is handled
+        self.pool.release(packet)
 
     ''' Sender '''
 
@@ -69,49 +69,49 @@ class TCP(Connection):
         """ Send data on the connection. Called by the application. This
             code currently sends all data immediately. """
         self.send_packet(data, self.sequence)
-        self.timer = Sim.scheduler.add(delay=self.timeout, event='retransmit', handler=self.retransmit)
+        self.timer = self.sim.timers.add(delay=self.timeout, event='retransmit', handler=self.retransmit)
 
     def send_packet(self, data, sequence):
-        packet = TCPPacket(source_address=self.source_address,
-                           source_port=self.source_port,
-                           destination_address=self.destination_address,
-                           destination_port=self.destination_port,
-                           body=data,
-                           sequence=sequence, ack_number=self.ack)
+        packet = self.pool.get(source_address=self.source_address,
+                               source_port=self.source_port,
+                               destination_address=self.destination_address,
+                               destination_port=self.destination_port,
+                               body=data,
+                               sequence=sequence, ack_number=self.ack)
 
         if sequence in self.drop and not sequence in self.dropped:
             self.dropped.append(sequence)
             self.plot_sequence(sequence,'drop')
-            self.trace("%s (%d) dropping TCP segment to %d for %d" % (
-                self.node.hostname, self.source_address, self.destination_address, packet.sequence))
+            self.trace("%s (%d) dropping TCP segment to %d for %d",
+                self.node.hostname, self.source_address, self.destination_address, packet.sequence)
             return
 
         # send the packet
         self.plot_sequence(sequence,'send')
-        self.trace("%s (%d) sending TCP segment to %d for %d" % (
-            self.node.hostname, self.source_address, self.destination_address, packet.sequence))
+        self.trace("%s (%d) sending TCP segment to %d for %d",
+            self.node.hostname, self.source_address, self.destination_address, packet.sequence)
         self.transport.send_packet(packet)
 
         # set a timer
         if not self.timer:
-            self.timer = Sim.scheduler.add(delay=self.timeout, event='retransmit', handler=self.retransmit)
+            self.timer = self.sim.timers.add(delay=self.timeout, event='retransmit', handler=self.retransmit)
 
     def handle_ack(self, packet):
         """ Handle an incoming ACK. """
         self.plot_sequence(packet.ack_number - 1000,'ack')
-        self.trace("%s (%d) received ACK from %d for %d" % (
-            self.node.hostname, packet.destination_address, packet.source_address, packet.ack_number))
+        self.trace("%s (%d) received ACK from %d for %d",
+            self.node.hostname, packet.destination_address, packet.source_address, packet.ack_number)
         self.cancel_timer()
 
     def retransmit(self, event):
         """ Retransmit data. """
-        self.trace("%s (%d) retransmission timer fired" % (self.node.hostname, self.source_address))
+        self.trace("%s (%d) retransmission timer fired", self.node.hostname, self.source_address)
 
     def cancel_timer(self):
         """ Cancel the timer. """
         if not self.timer:
             return
-        Sim.scheduler.cancel(self.timer)
+        self.sim.timers.cancel(self.timer)
         self.timer = None
 
     ''' Receiver '''
@@ -120,19 +120,19 @@ class TCP(Connection):
         """ Handle incoming data. This code currently gives all data to
             the application, regardless of whether it is in order, and sends
             an ACK."""
-        self.trace("%s (%d) received TCP segment from %d for %d" % (
-            self.node.hostname, packet.destination_address, packet.source_address, packet.sequence))
+        self.trace("%s (%d) received TCP segment from %d for %d",
+            self.node.hostname, packet.destination_address, packet.source_address, packet.sequence)
         self.app.receive_data(packet.body)
         self.send_ack()
 
     def send_ack(self):
         """ Send an ack. """
-        packet = TCPPacket(source_address=self.source_address,
-                           source_port=self.source_port,
-                           destination_address=self.destination_address,
-                           destination_port=self.destination_port,
-                           sequence=self.sequence, ack_number=self.ack)
+        packet = self.pool.get(source_address=self.source_address,
+                               source_port=self.source_port,
+                               destination_address=self.destination_address,
+                               destination_port=self.destination_port,
+                               sequence=self.sequence, ack_number=self.ack)
         # send the packet
-        self.trace("%s (%d) sending TCP ACK to %d for %d" % (
-            self.node.hostname, self.source_address, self.destination_address, packet.ack_number))
+        self.trace("%s (%d) sending TCP ACK to %d for %d",
+            self.node.hostname, self.source_address, self.destination_address, packet.ack_number)
         self.transport.send_packet(packet)
\ No newline at end of file
@@ -0,0 +1,201 @@
+import itertools
+import math
+
+
+class Timer(object):
+    """ A timer held by a TimerWheel. The bucket is the wheel slot the
+        timer is stored in, or None once it has fired or been cancelled."""
+
+    __slots__ = ('expires', 'sequence', 'handler', 'event', 'bucket')
+
+    def __init__(self, expires, sequence, handler, event):
+        self.expires = expires
+        self.sequence = sequence
+        self.handler = handler
+        self.event = event
+        self.bucket = None
+
+    def active(self):
+        return self.bucket is not None
+
+
+class TimerWheel(object):
+    """ Hierarchical timing wheel for coarse protocol timers.
+
+        Time is divided into ticks of the given resolution. The wheel has
+        several levels of slots; level 0 holds timers expiring within the
+        next 2**bits ticks, level 1 those within the next 2**(2*bits) ticks,
+        and so on. Timers in the higher levels are cascaded down as their
+        expiration approaches. Adding and cancelling a timer only touches
+        one slot, so both are O(1) regardless of how many timers are armed.
+
+        The wheel keeps at most one wakeup event in the scheduler, at the
+        earliest expiration it knows of, so the scheduler only sees an event
+        when a timer actually fires. Timers fire at the end of the tick in
+        which they expire, so expirations are rounded up to the
+        resolution. Cancelling a timer never touches the scheduler, which
+        means the wheel may wake up once to find nothing to do."""
+
+    def __init__(self, scheduler, resolution=0.001, bits=8, levels=4):
+        self.scheduler = scheduler
+        self.resolution = resolution
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.levels = levels
+        self.wheels = [[{} for _ in range(1 << bits)] for _ in range(levels)]
+        # timers too far in the future for the top level
+        self.overflow = {}
+        # last tick the wheel has advanced to
+        self.tick = 0
+        self.count = itertools.count()
+        self.pending = 0
+        # scheduler event and tick of the next wakeup
+        self.wakeup = None
+        self.wakeup_tick = None
+        # start over whenever the scheduler's clock does
+        scheduler.add_reset_handler(self.clear)
+
+    def clear(self):
+        """ Discard every pending timer. This is done whenever the
+            scheduler is reset. """
+        for wheel in self.wheels:
+            for bucket in wheel:
+                for timer in bucket:
+                    timer.bucket = None
+                bucket.clear()
+        for timer in self.overflow:
+            timer.bucket = None
+        self.overflow.clear()
+        self.tick = 0
+        self.pending = 0
+        self.wakeup = None
+        self.wakeup_tick = None
+
+    # -- Timers --
+
+    def add(self, delay, event, handler):
+        """ Arm a timer that calls handler(event) after delay seconds.
+            Returns a timer that can be passed to cancel or rearm. """
+        timer = Timer(0, next(self.count), handler, event)
+        self.arm(timer, delay)
+        return timer
+
+    def cancel(self, timer):
+        """ Cancel a timer. Cancelling a timer that has already fired or
+            been cancelled does nothing. """
+        if timer.bucket is None:
+            return
+        del timer.bucket[timer]
+        timer.bucket = None
+        self.pending -= 1
+
+    def rearm(self, timer, delay):
+        """ Re-arm a timer so it expires delay seconds from now. """
+        self.cancel(timer)
+        self.arm(timer, delay)
+
+    def arm(self, timer, delay):
+        now = self.scheduler.current_time()
+        if self.pending == 0:
+            # the wheel is empty, so it can jump straight to the present;
+            # this also follows the clock back after a scheduler reset
+            self.tick = int(now / self.resolution)
+        expires = int(math.ceil((now + delay) / self.resolution))
+        timer.expires = max(expires, self.tick + 1)
+        self.insert(timer)
+        self.pending += 1
+        if self.wakeup_tick is None or timer.expires < self.wakeup_tick:
+            self.schedule(timer.expires)
+
+    def insert(self, timer):
+        delta = timer.expires - self.tick
+        for level in range(self.levels):
+            if delta < 1 << (self.bits * (level + 1)):
+                slot = (timer.expires >> (self.bits * level)) & self.mask
+                timer.bucket = self.wheels[level][slot]
+                break
+        else:
+            timer.bucket = self.overflow
+        timer.bucket[timer] = None
+
+    # -- Advancing the wheel --
+
+    def schedule(self, tick):
+        """ Schedule the wakeup event for the given tick. """
+        if self.wakeup is not None:
+            self.scheduler.cancel(self.wakeup)
+        delay = max(0, tick * self.resolution - self.scheduler.current_time())
+        self.wakeup = self.scheduler.add(delay=delay, event=None, handler=self.expire)
+        self.wakeup_tick = tick
+
+    def expire(self, event):
+        """ Handle the wakeup event: advance the wheel to the current tick
+            and fire every timer that has expired. """
+        target = self.wakeup_tick
+        self.wakeup = None
+        self.wakeup_tick = None
+        expired = self.advance(target)
+        if self.pending:
+            self.schedule(self.next_expiration())
+        for timer in sorted(expired, key=lambda t: t.sequence):
+            timer.handler(timer.event)
+
+    def advance(self, target):
+        """ Move the wheel forward to the target tick, cascading timers from
+            the higher levels at each level 0 boundary that is crossed, and
+            return the timers that expire on the way. No pending timer
+            expires strictly between two wakeups, so only the boundaries
+            and the target tick itself need to be visited. """
+        expired = []
+        while self.tick < target:
+            boundary = (self.tick | self.mask) + 1
+            self.tick = min(boundary, target)
+            if self.tick == boundary:
+                self.cascade()
+            self.collect(self.wheels[0][self.tick & self.mask], expired)
+        return expired
+
+    def cascade(self):
+        for level in range(1, self.levels):
+            index = (self.tick >> (self.bits * level)) & self.mask
+            self.reinsert(self.wheels[level][index])
+            if index != 0:
+                return
+        self.reinsert(self.overflow)
+
+    def reinsert(self, bucket):
+        timers = list(bucket)
+        bucket.clear()
+        for timer in timers:
+            self.insert(timer)
+
+    def collect(self, bucket, expired):
+        for timer in bucket:
+            timer.bucket = None
+            expired.append(timer)
+        self.pending -= len(bucket)
+        bucket.clear()
+
+    def next_expiration(self):
+        """ Return the earliest tick at which a pending timer expires. """
+        earliest = None
+        wheel = self.wheels[0]
+        for offset in range(1, self.mask + 1):
+            if wheel[(self.tick + offset) & self.mask]:
+                earliest = self.tick + offset
+                break
+        for level in range(1, self.levels):
+            wheel = self.wheels[level]
+            index = (self.tick >> (self.bits * level)) & self.mask
+            for offset in range(1, self.mask + 2):
+                bucket = wheel[(index + offset) & self.mask]
+                if bucket:
+                    expires = min(timer.expires for timer in bucket)
+                    if earliest is None or expires < earliest:
+                        earliest = expires
+                    break
+        if self.overflow:
+            expires = min(timer.expires for timer in self.overflow)
+            if earliest is None or expires < earliest:
+                earliest = expires
+        return earliest
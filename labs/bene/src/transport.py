@@ -1,9 +1,7 @@
-from .sim import Sim
-
-
 class Transport(object):
     def __init__(self, node):
         self.node = node
+        self.sim = node.sim
         self.binding = {}
         self.node.add_protocol(protocol="TCP", handler=self)
 
@@ -21,4 +19,4 @@ class Transport(object):
         self.binding[address_data].receive_packet(packet)
 
     def send_packet(self, packet):
-        Sim.scheduler.add(delay=0, event=packet, handler=self.node.send_packet)
+        self.sim.scheduler.add(delay=0, event=packet, handler=self.node.send_packet)
@@ -0,0 +1,69 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.buffer import ReceiveBuffer, SendBuffer
+
+
+def content(data):
+    # reads within one chunk may be memoryviews
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    return data
+
+
+def filled(count=100, size=10):
+    buffer = SendBuffer()
+    data = bytes(bytearray(i % 256 for i in range(count * size)))
+    for i in range(0, len(data), size):
+        buffer.put(data[i:i + size])
+    return buffer, data
+
+
+def test_send_buffer_ignores_old_ack():
+    buffer, data = filled()
+    buffer.get(1000)
+    buffer.slide(500)
+    buffer.slide(300)
+    assert buffer.base_seq == 500
+    segment, sequence = buffer.resend(100)
+    assert sequence == 500
+    assert content(segment) == data[500:600]
+
+
+def test_send_buffer_reads_across_chunks():
+    buffer, data = filled()
+    buffer.slide(0)
+    segment, sequence = buffer.get(35)
+    assert (content(segment), sequence) == (data[:35], 0)
+    segment, sequence = buffer.get(5)
+    assert (content(segment), sequence) == (data[35:40], 35)
+    buffer.slide(15)
+    segment, sequence = buffer.resend(50)
+    assert (content(segment), sequence) == (data[15:65], 15)
+
+
+def test_receive_buffer_copies_mutable_data():
+    buffer = ReceiveBuffer()
+    data = bytearray(b'abcdef')
+    buffer.put(data, 10)
+    data[0:3] = b'xyz'
+    del data[:]
+    buffer.put(b'0123456789', 0)
+    assert buffer.get() == (b'0123456789abcdef', 0)
+    assert buffer.sack_blocks() == []
+
+
+def test_receive_buffer_reassembles_out_of_order():
+    buffer = ReceiveBuffer()
+    data = bytes(bytearray(i % 256 for i in range(100)))
+    buffer.put(memoryview(data)[40:60], 40)
+    buffer.put(data[10:30], 10)
+    buffer.put(data[25:45], 25)
+    assert buffer.sack_blocks() == [(10, 60)]
+    assert buffer.get() == (b'', 0)
+    buffer.put(data[0:15], 0)
+    assert buffer.get() == (data[0:60], 0)
+    buffer.put(data[50:100], 50)
+    assert buffer.get() == (data[60:100], 60)
@@ -0,0 +1,34 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.link import Link
+from src.node import Node
+from src.packet import Packet
+from src.packetqueue import RED
+from src.sim import Simulation
+
+
+def test_red_admits_once_per_arrival():
+    sim = Simulation(seed=1)
+    n1 = Node('n1', sim=sim)
+    n2 = Node('n2', sim=sim)
+    link = Link(address=1, startpoint=n1, endpoint=n2, queue_size=50, bandwidth=1000000)
+    link.set_discipline('red', min_threshold=1, max_threshold=5, weight=0.2)
+    calls = []
+    admits = link.queue.admits
+
+    def counted(packet):
+        calls.append(packet)
+        return admits(packet)
+
+    link.queue.admits = counted
+    for i in range(200):
+        link.send_packet(Packet(ident=i, length=1000))
+    assert len(calls) == 200
+    queue = link.queue
+    assert isinstance(queue, RED)
+    assert queue.dropped > 0
+    # every arrival is either dropped, queued, or sent at once
+    assert queue.dropped + queue.enqueued + 1 == 200
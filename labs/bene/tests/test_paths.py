@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from networks import paths
+
+
+def routes(engine, count, edges):
+    """ Return the rows of hops for every destination, by source. """
+    hops = [[] for _ in range(count)]
+    for destinations, chunk in engine(count, edges, 256):
+        for source in range(count):
+            hops[source].extend(chunk[source])
+    return hops
+
+
+def test_multipath_skips_neighbors_that_cannot_reach():
+    # node 3 is reached from 0 but has no links out
+    edges = [(0, 1, 1), (1, 0, 1), (1, 2, 1), (2, 1, 1), (0, 3, 1)]
+    engines = [paths.dijkstra_multipath]
+    if paths.numpy is not None:
+        engines.append(paths.sparse_multipath)
+    for engine in engines:
+        hops = routes(engine, 4, edges)
+        assert hops[0] == [(), (1,), (1,), (3,)]
+        assert hops[3] == [(), (), (), ()]
+        assert hops[2] == [(1,), (1,), (), (1,)]
@@ -0,0 +1,29 @@
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.recorder import Recorder, load
+from src.scheduler import Scheduler
+
+
+def test_binary_round_trip():
+    directory = tempfile.mkdtemp()
+    try:
+        scheduler = Scheduler()
+        recorder = Recorder(scheduler, directory, 'binary', chunk=4)
+        recorder.channel('queue', ('Queue Size',))
+        entity = recorder.entity('n1-n2', 'n1')
+        recorder.select('n1-n2')
+        for size in range(10):
+            scheduler.current = size * 0.5
+            recorder.record('queue', entity, 'size', size)
+        recorder.close()
+        columns = load(os.path.join(directory, 'queue.bin'))
+        assert list(columns['time']) == [size * 0.5 for size in range(10)]
+        assert list(columns['value0']) == list(range(10))
+        assert list(columns['entity']) == [entity] * 10
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,134 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from networks import generators
+from networks.network import Network
+from src.forwarding import NextHopGroup
+from src.linkstate import LinkState
+from src.node import Node
+from src.sim import Simulation
+
+
+def converge(net):
+    """ Exchange distance vectors between neighbors until none changes. """
+    changed = True
+    while changed:
+        changed = False
+        for n in net.nodes.values():
+            vector = dict(n.get_distance_vector())
+            for link in n.links:
+                if link.endpoint.update_distance_vector(n.hostname, vector):
+                    changed = True
+
+
+def test_distance_vector_multipath():
+    net = Network(generators.ring(4), sim=Simulation(seed=1))
+    for n in net.nodes.values():
+        n.init_routing(multipath=True)
+    converge(net)
+    groups = {}
+    for n in net.nodes.values():
+        for address, link in n.forwarding_table.items():
+            if isinstance(link, NextHopGroup):
+                groups[n.hostname, address] = set(l.endpoint.hostname for l in link.links)
+    # each node reaches both links of the opposite node two ways
+    assert len(groups) == 8
+    for (hostname, address), neighbors in groups.items():
+        assert len(neighbors) == 2
+        assert hostname not in neighbors
+
+
+def test_distance_vector_repeated_vector():
+    net = Network(generators.ring(4), sim=Simulation(seed=1))
+    for n in net.nodes.values():
+        n.init_routing(multipath=True)
+    converge(net)
+    # deliver every vector again, in full and then as a delta that
+    # repeats every entry
+    for sequence, delta in ((1, False), (2, True)):
+        for n in net.nodes.values():
+            vector = dict(n.get_distance_vector())
+            for link in n.links:
+                link.endpoint.update_distance_vector(n.hostname, vector, sequence, delta)
+    for n in net.nodes.values():
+        for hops in n.next_hops.values():
+            assert len(set(hops)) == len(hops)
+        for link in n.forwarding_table.values():
+            if isinstance(link, NextHopGroup):
+                assert len(set(link.links)) == len(link.links) == 2
+
+
+def test_distance_vector_single_path():
+    net = Network(generators.ring(4), sim=Simulation(seed=1))
+    for n in net.nodes.values():
+        n.init_routing()
+    converge(net)
+    for n in net.nodes.values():
+        assert not any(isinstance(link, NextHopGroup) for link in n.forwarding_table.values())
+        for m in net.nodes.values():
+            if m is not n:
+                assert all(address in n.forwarding_table for address in m.addresses)
+
+
+def test_link_state_spread_over_links_of_no_cost():
+    sim = Simulation(seed=1)
+    engine = LinkState(Node('r', sim=sim), multipath=True)
+    links = {'r': {'a': 1, 'b': 1}, 'a': {'y': 0}, 'b': {'y': 0}, 'y': {}}
+    engine.database = dict((name, (1, neighbors, ())) for name, neighbors in links.items())
+    engine.incoming = {}
+    for start, neighbors in links.items():
+        for end, cost in neighbors.items():
+            engine.incoming.setdefault(end, {})[start] = cost
+    # y ties with both nodes it is reached through, and comes first
+    engine.distance = {'r': 0, 'y': 1, 'a': 1, 'b': 1}
+    engine.spread()
+    assert engine.first_hops == {'a': ('a',), 'b': ('b',), 'y': ('a', 'b')}
+
+
+def test_static_routes_skip_unreachable_destinations():
+    for hierarchical in (False, True):
+        # a ring with a link of no cost, and a node cut off from it
+        topology = generators.ring(3, propagation=0.0)
+        topology.connect(0, topology.add_node('n4'))
+        net = Network(topology, sim=Simulation(seed=1), hierarchical=hierarchical)
+        for link in net.links.values():
+            names = (link.startpoint.hostname, link.endpoint.hostname)
+            if 'n4' in names:
+                link.running = False
+            elif 'n3' in names:
+                link.propagation = 0.001
+        net.route('delay', multipath=True)
+        for n in net.nodes.values():
+            assert None not in n.forwarding_table.values()
+            for level in n.forwarding_table.prefixes.values():
+                assert None not in level.values()
+
+
+def test_links_of_no_cost_are_rejected():
+    net = Network(generators.ring(4), sim=Simulation(seed=1))
+    try:
+        net.route(lambda link: 0, multipath=True)
+    except ValueError:
+        pass
+    else:
+        assert False, "a link of no cost was accepted"
+
+
+def test_multipath_without_loops_over_zero_propagation():
+    net = Network(generators.grid(4, 4, seed=1, propagation=generators.choice(0.0, 0.001)), sim=Simulation(seed=1))
+    net.route('delay', multipath=True)
+
+    def hops(n, address):
+        link = n.forwarding_table.get(address)
+        links = link.links if isinstance(link, NextHopGroup) else [link] if link else []
+        return set(l.endpoint.hostname for l in links)
+
+    groups = 0
+    for n in net.nodes.values():
+        for address, link in n.forwarding_table.items():
+            groups += isinstance(link, NextHopGroup)
+            for name in hops(n, address):
+                assert n.hostname not in hops(net.nodes[name], address)
+    assert groups > 0
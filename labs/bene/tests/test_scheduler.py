@@ -0,0 +1,59 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.scheduler import CalendarScheduler, Scheduler
+
+
+def fill(scheduler, times):
+    ran = []
+    for t in times:
+        scheduler.add(delay=t, event=t, handler=ran.append)
+    return ran
+
+
+def test_run_until_twice():
+    for scheduler in (Scheduler(), CalendarScheduler()):
+        ran = fill(scheduler, range(1, 20))
+        scheduler.run(until=10, max_events=2)
+        scheduler.run(until=10)
+        assert ran == list(range(1, 10))
+        assert scheduler.current_time() == 10
+        scheduler.run()
+        assert ran == list(range(1, 20))
+
+
+def test_run_after_stop():
+    for scheduler in (Scheduler(), CalendarScheduler()):
+        ran = fill(scheduler, range(1, 20))
+
+        def stop(event):
+            ran.append(event)
+            scheduler.stop()
+
+        scheduler.add(delay=5, event='stop', handler=stop)
+        scheduler.run()
+        assert ran == list(range(1, 6)) + ['stop']
+        scheduler.run(until=10)
+        scheduler.run(until=10)
+        scheduler.run()
+        assert ran == list(range(1, 6)) + ['stop'] + list(range(6, 20))
+
+
+def test_markers_leave_no_tombstones():
+    scheduler = Scheduler()
+    fill(scheduler, range(1, 20))
+    scheduler.run(until=10, max_events=2)
+    assert len(scheduler.queue) == scheduler.pending() == 17
+
+
+def test_run_until_past_time():
+    for scheduler in (Scheduler(), CalendarScheduler()):
+        ran = fill(scheduler, [10, 20])
+        scheduler.run(until=15)
+        scheduler.run(until=5)
+        assert scheduler.current_time() == 15
+        scheduler.add(delay=1, event=16, handler=ran.append)
+        scheduler.run()
+        assert ran == [10, 16, 20]
@@ -0,0 +1,20 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.scheduler import Scheduler
+from src.timer import TimerWheel
+
+
+def test_wheel_follows_scheduler_reset():
+    scheduler = Scheduler()
+    wheel = TimerWheel(scheduler)
+    fired = []
+    wheel.add(delay=5, event='old', handler=fired.append)
+    scheduler.run(until=1)
+    scheduler.reset()
+    wheel.add(delay=0.5, event='new', handler=fired.append)
+    scheduler.run()
+    assert fired == ['new']
+    assert scheduler.current_time() == 0.5
@@ -0,0 +1,29 @@
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from networks import topology
+
+DIRECTORY = os.path.join(os.path.dirname(__file__), '..', 'networks')
+
+
+def test_compiled_topology_matches_parsed():
+    cache = os.path.join(tempfile.mkdtemp(), 'cache')
+    try:
+        for name in sorted(os.listdir(DIRECTORY)):
+            if not name.endswith('.txt'):
+                continue
+            filename = os.path.join(DIRECTORY, name)
+            parsed = topology.parse(filename, ('red',))
+            for _ in range(2):
+                # compiled on the first load, and read back on the second
+                loaded = topology.load(filename, ('red',), cache)
+                assert loaded.names == parsed.names
+                assert loaded.links == parsed.links
+                assert loaded.settings == parsed.settings
+                assert loaded.disciplines == parsed.disciplines
+    finally:
+        shutil.rmtree(os.path.dirname(cache))